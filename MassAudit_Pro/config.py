@@ -1,50 +1,154 @@
 
 import os
 import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
 
-API_KEY = "YOUR-APIKEY"
+from dotenv import load_dotenv
 
-API_BASE = "https://api.deepseek.com/v1"
+@dataclass(frozen=True)
+class Settings:
+    """
+    运行时配置（密钥、接口地址、代理、路径），从环境变量与项目根目录的 .env 文件读取，不再硬编码在源码中。
+    实例不可变，可以安全地作为缓存键的一部分或在线程间共享。
+    """
+    api_key: str = field(repr=False) # 不在日志/repr 中暴露密钥
+    api_base: str = "https://api.deepseek.com/v1"
+    projects_root: str = "/opt/source_code"
+    db_storage: str = "/opt/codeql-home/workspace/project_dbs"
+    http_proxy: Optional[str] = None
+    https_proxy: Optional[str] = None
+    all_proxy: Optional[str] = None
+    log_level: str = "INFO"
 
-#可用其它大模型
-#配置接口，自己改
-#API_KEY = os.getenv("DEEPSEEK_API_KEY", "")
-#API_BASE = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com/v1")
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """
+        从环境变量构建配置。.env 中的值不会覆盖已存在的环境变量。
+        """
+        load_dotenv(override=False)
+        defaults = cls(api_key="")
+        return cls(
+            # 可用其它大模型，配置对应的 Key 与接口地址即可
+            api_key=os.getenv("DEEPSEEK_API_KEY", ""),
+            api_base=os.getenv("DEEPSEEK_API_BASE", defaults.api_base),
+            projects_root=os.getenv("PROJECTS_ROOT", defaults.projects_root),
+            db_storage=os.getenv("DB_STORAGE", defaults.db_storage),
+            # 代理配置，国内请用魔法，xray 默认端口为 http 10809 / socks5 10808，官方规则库调用需要
+            http_proxy=os.getenv("HTTP_PROXY") or None,
+            https_proxy=os.getenv("HTTPS_PROXY") or None,
+            all_proxy=os.getenv("ALL_PROXY") or None,
+            log_level=os.getenv("LOG_LEVEL", defaults.log_level).upper(),
+        )
 
+    def apply_proxy_env(self) -> None:
+        """
+        设置代理环境变量以确保子进程（CodeQL 下载规则包等）也能使用代理。
+        """
+        for name, value in (("HTTP_PROXY", self.http_proxy), ("HTTPS_PROXY", self.https_proxy), ("ALL_PROXY", self.all_proxy)):
+            if value:
+                os.environ[name] = value
 
-# 代理配置 (严格硬编码)，国内请用魔法,如下是xray默认端口，官方规则库调用需要
-#HTTP_PROXY = "http://127.0.0.1:10809"
-#HTTPS_PROXY = "http://127.0.0.1:10809"
-#ALL_PROXY = "socks5://127.0.0.1:10808"
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    获取全局配置（首次调用时加载，之后复用同一个实例）。
+    """
+    return Settings.from_env()
 
-# 设置环境变量以确保代理生效
-#os.environ['HTTP_PROXY'] = HTTP_PROXY
-#os.environ['HTTPS_PROXY'] = HTTPS_PROXY
-#os.environ['ALL_PROXY'] = ALL_PROXY
+# 注意：导入本模块时仍会读取环境变量与 .env（下方模块级常量需要具体值），但不再配置日志或输出任何内容
+_settings = get_settings()
+
+API_KEY = _settings.api_key
+API_BASE = _settings.api_base
 
 # 项目路径配置
-PROJECTS_ROOT = "/opt/source_code"
-DB_STORAGE = "/opt/codeql-home/workspace/project_dbs"
+PROJECTS_ROOT = _settings.projects_root
+DB_STORAGE = _settings.db_storage
 
 # --- 3. 核心功能模块需求相关配置 ---
 
 # 3.2 熔断与限流机制
 MAX_CONTEXT_RETRIES = 3  # 单个漏洞最多允许AI“追问”3次
 MAX_CALLS_PER_PROJECT = 100 # 单个项目允许的最大API调用次数
-MAX_API_ERROR_COUNT = 5 # 如果连续5个请求发生API连接超时或500错误，立即终止脚本
+CALL_BUDGET_PATH = os.path.join(DB_STORAGE, "call_budget.json") # 项目调用计数的持久化文件，中断后续扫可恢复
+CALL_BUDGET_FLUSH_EVERY = 10 # 每累计多少次调用落盘一次
+C2_FLUSH_EVERY = 20 # 单个项目每累计多少条高/中危漏洞写入一次 C2 数据库（一个事务），项目中断时最多丢失这么多条
+MAX_API_ERROR_COUNT = 5 # 如果连续5个请求发生API连接超时或500错误，熔断器打开
+CIRCUIT_RESET_TIMEOUT_S = 60 # 熔断打开后多久开始半开探测（秒）
+CIRCUIT_HALF_OPEN_MAX_CALLS = 3 # 半开状态下允许的探测请求数
+RETRY_BASE_WAIT_S = 1 # 重试退避的基础等待时间（秒）
+RETRY_MAX_WAIT_S = 30 # 重试退避的最长等待时间（秒）
+
+# 3.2.1 限速
+REQUESTS_PER_SECOND = 2 # 每个 (项目, 模型) 的平均请求速率上限，<=0 表示不限速
+RATE_LIMIT_BURST = 5 # 令牌桶容量，允许的瞬时突发请求数
+
+# 3.2.2 LLM 响应缓存
+LLM_CACHE_PATH = os.path.join(DB_STORAGE, "llm_cache.db") # 磁盘缓存位置，置空则仅使用内存缓存
+LLM_CACHE_TTL_S = 7 * 24 * 3600 # 缓存有效期（秒）
+LLM_CACHE_MEMORY_ITEMS = 1024 # 进程内LRU缓存的条目上限
+
+# 3.2.3 Prompt 压缩
+PROMPT_COMPRESS_LEVEL = "standard" # off / lite / standard / full
+MAX_INPUT_TOKENS = 24000 # 单次请求的输入token预算，超出时截断最长的代码块
+
+# 3.2.4 模型路由与成本统计
+DEFAULT_MODEL = "deepseek-chat" # 简单分类/判定任务使用的模型
+COMPLEX_MODEL = "deepseek-reasoner" # 复杂研判任务使用的推理模型
+COMPLEX_TOKEN_THRESHOLD = 6000 # 输入超过该token数视为复杂任务
+DEFAULT_MODEL_TEMPERATURE = 0.7 # 对话模型的采样温度（推理模型不支持 temperature，不会传入）
+COMPLEX_MODEL_MAX_TOKENS = 8192 # 推理模型的 max_tokens 下限，需容纳推理之后完整的 JSON 回答
+# 单价：美元 / 百万 token，请按官方价目表自行调整
+MODEL_PRICES = {
+    "deepseek-chat": {"input": 0.27, "output": 1.10},
+    "deepseek-reasoner": {"input": 0.55, "output": 2.19},
+}
 
 # 3.3 鲁棒性与错误处理
 FILE_SIZE_LIMIT_MB = 1 # 超大文件保护，超过1MB截断
+FILE_CACHE_MAX_MB = 256 # 上下文搜索时文件内容缓存的总上限（按字符数计）
+RG_TIMEOUT_S = 60 # ripgrep 上下文搜索的超时时间（秒）
+SYMBOL_INDEX_ENABLED = True # 为每个项目建立符号索引（以 JSON 缓存于 DB_STORAGE/symbol_index/<项目名>-<路径哈希>/symbols.json），加速上下文查找
+CONTEXT_SCAN_WORKERS = int(os.getenv("CONTEXT_SCAN_WORKERS", min(32, (os.cpu_count() or 1) * 4))) # 上下文搜索并发扫描文件的线程数，可用同名环境变量覆盖
+# 上下文搜索/符号索引时整棵跳过的目录（依赖、构建产物、缓存），另外所有以 '.' 开头的隐藏目录也会被跳过
+PRUNE_DIRS = frozenset({'.git', 'vendor', 'node_modules', '.venv', 'venv', '__pycache__', 'dist', 'build',
+                        'target', 'testdata', 'third_party', '.tox', '.mypy_cache', '.pytest_cache'})
+SNIPPET_FILE_CACHE_SIZE = 64 # 截取漏洞代码片段时缓存的源文件数（LRU），同一文件的多条告警只读一次
+SNIPPET_CACHE_MAX_FILE_MB = 1 # 超过该大小的源文件不缓存整份行列表，每次只流式读取告警附近的行
+SKIP_FILE_SUFFIXES = ('.min.js', '.pb.go', '_generated.go', '.lock') # 压缩/生成的文件，不值得做正则扫描
+
+# 3.3.1 外部命令
+CODEQL_COMMAND_TIMEOUT_S = 2 * 3600 # 单条 CodeQL 命令的超时时间（秒）
+COMMAND_OUTPUT_TAIL_LINES = 200 # 命令输出在内存中保留的末尾行数
+COMMAND_DRAIN_TIMEOUT_S = 10 # 命令被终止后等待输出管道读完的最长时间（秒）
+POC_OUTPUT_TAIL_LINES = 4096 # PoC 验证 (go test) 的 stdout/stderr 各自在内存中保留的末尾行数
+POC_OUTPUT_LINE_MAX_CHARS = 512 # PoC 输出单行保留的最大字符数，使保留的输出总量有上界
+SARIF_STREAM_THRESHOLD_MB = 10 # 超过该大小的 SARIF 文件使用 ijson 流式解析
+SARIF_CACHE_ENABLED = True # 按 (CodeQL 版本, 语言, 查询包及其版本, 源码树指纹) 缓存 SARIF 结果（DB_STORAGE/sarif_cache），源码未变化时跳过建库与扫描；--rescan 模式不读取缓存
+CODEQL_RESOLVE_TIMEOUT_S = 120 # 查询 CodeQL 版本与查询包路径的超时时间（秒）
+CODEQL_CONCURRENCY = max(1, (os.cpu_count() or 2) // 2) # 同时进行 CodeQL 建库/扫描的项目数
+PROJECT_AUDIT_CONCURRENCY = 2 # 同时进行 AI 研判与 PoC 验证的项目数
+FINDING_ANALYSIS_CONCURRENCY = 8 # 单个项目内同时向 LLM 研判的告警数
+POC_VERIFY_CONCURRENCY = 4 # 单个项目内同时进行 PoC 验证（go test + 自愈修复）的告警数
 
-PROJECT_API_CALL_COUNTS = {} # 用于跟踪每个项目的API调用次数
+# 3.4 语言识别
+LANG_DETECT_SAMPLE_LIMIT = 2000 # 语言识别最多采样的源文件数
+LANG_DETECT_DOMINANCE = 0.7 # 某语言占比超过该比例即提前结束采样
+LANG_DETECT_DOMINANCE_MIN_FILES = 200 # 提前结束前该语言至少需要的文件数
 
-# --- 5. 初始日志设置 ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
 
-print("config.py loaded and initialized.")
+# --- 5. 日志设置 ---
+def setup_logging(level: Optional[str] = None) -> None:
+    """
+    配置根日志记录器。由程序入口显式调用，导入 config 不再产生副作用。
+    :param level: 日志级别，为None时使用配置中的 LOG_LEVEL。
+    """
+    logging.basicConfig(
+        level=level or get_settings().log_level,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler()
+        ]
+    )
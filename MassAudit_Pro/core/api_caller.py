@@ -1,29 +1,128 @@
 
 import os
+import time
+import re
+import random
+import threading
 import logging
+from typing import Optional, Dict
 from openai import OpenAI, APIStatusError, APIConnectionError, APITimeoutError
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import retry, stop_after_attempt, retry_if_exception
 
 # Import constants from the config file
 from MassAudit_Pro.config import (
     API_KEY,
     API_BASE,
     MAX_API_ERROR_COUNT,
-    PROJECT_API_CALL_COUNTS
+    RETRY_BASE_WAIT_S,
+    RETRY_MAX_WAIT_S,
+    CIRCUIT_RESET_TIMEOUT_S,
+    CIRCUIT_HALF_OPEN_MAX_CALLS,
+    REQUESTS_PER_SECOND,
+    RATE_LIMIT_BURST,
+    DEFAULT_MODEL,
+    COMPLEX_MODEL,
+    DEFAULT_MODEL_TEMPERATURE,
+    COMPLEX_MODEL_MAX_TOKENS
+)
+from MassAudit_Pro.core.llm_cache import LLMCache
+from MassAudit_Pro.core.circuit_breaker import CircuitBreaker
+from MassAudit_Pro.core.rate_limiter import TokenBucket
+from MassAudit_Pro.core.call_budget import CallBudget
+from MassAudit_Pro.core.prompt_compressor import PromptCompressor
+from MassAudit_Pro.core.model_router import select_model_by_complexity, CostAnalyzer
+from MassAudit_Pro.utils import json_utils
+
+# 响应中的 JSON 对象（贪婪匹配，从第一个 '{' 到最后一个 '}'）
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.S)
+
+def _extract_json_object(text: Optional[str]) -> Optional[str]:
+    """
+    从模型输出中取出可解析的 JSON 对象文本（允许外面包着 ```json 围栏或说明文字），取不到时返回None。
+    """
+    if not text:
+        return None
+    for candidate in (text, *(m.group() for m in [_JSON_OBJECT_RE.search(text)] if m)):
+        try:
+            if isinstance(json_utils.loads(candidate), dict):
+                return candidate
+        except json_utils.JSONDecodeError:
+            continue
+    return None
+
+def _is_retryable_error(e: BaseException) -> bool:
+    """
+    仅对连接错误、超时、429 和 5xx 重试；其余 4xx（鉴权、参数错误等）重试也无济于事。
+    """
+    if isinstance(e, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(e, APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return False
+
+def _counts_as_breaker_failure(e: BaseException) -> bool:
+    """
+    只有连接错误、超时和 5xx 说明服务端不可用，计入熔断；4xx 不计入。
+    """
+    if isinstance(e, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+def _retry_after_seconds(e: Optional[BaseException]) -> Optional[float]:
+    """
+    从 429 响应的 Retry-After 头中解析服务端建议的等待秒数，无法解析时返回None。
+    """
+    if not isinstance(e, APIStatusError) or e.status_code != 429 or e.response is None:
+        return None
+    try:
+        return max(0.0, float(e.response.headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+class _DecorrelatedJitterWait:
+    """
+    tenacity 等待策略：优先遵循 Retry-After，否则使用去相关抖动退避
+    sleep = min(cap, uniform(base, prev * 3))，避免并行 worker 同步重试形成重试风暴。
+    """
+    def __init__(self, base: float, cap: float):
+        self.base = base
+        self.cap = cap
+
+    def __call__(self, retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = _retry_after_seconds(exc)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 1)
+        # upcoming_sleep 此时仍是上一次的等待时间
+        prev = retry_state.upcoming_sleep or self.base
+        return min(self.cap, random.uniform(self.base, prev * 3))
+
+# API 调用的重试策略
+_RETRY_POLICY = dict(
+    wait=_DecorrelatedJitterWait(RETRY_BASE_WAIT_S, RETRY_MAX_WAIT_S),
+    stop=stop_after_attempt(5), # 最多重试5次
+    retry=retry_if_exception(_is_retryable_error),
+    before_sleep=lambda retry_state: logging.warning(
+        f"API call failed ({retry_state.outcome.exception()}), retrying... (attempt {retry_state.attempt_number})"
+    )
 )
 
 class APICaller:
     """
     封装DeepSeek API调用逻辑，集成tenacity进行指数退避重试，处理API错误和全局熔断。
+    熔断器为进程内所有 APICaller 共享，打开后经过 CIRCUIT_RESET_TIMEOUT_S 自动半开探测恢复。
     """
-    _consecutive_api_errors = 0
-    _circuit_breaker_tripped = False
+    _breaker = CircuitBreaker(MAX_API_ERROR_COUNT, CIRCUIT_RESET_TIMEOUT_S, CIRCUIT_HALF_OPEN_MAX_CALLS)
 
-    def __init__(self, api_key: str, api_base: str):
+    def __init__(self, api_key: str, api_base: str, cache: Optional[LLMCache] = None,
+                 compressor: Optional[PromptCompressor] = None, budget: Optional[CallBudget] = None):
         """
         初始化APICaller，设置DeepSeek API客户端。
         :param api_key: DeepSeek API Key
         :param api_base: DeepSeek API Base URL
+        :param cache: 可选的LLM响应缓存，命中时跳过网络请求
+        :param compressor: 可选的Prompt压缩器，在发送（及查缓存）前压缩消息
+        :param budget: 可选的项目级调用额度，传入 project_name 的调用会在发请求前检查额度并在成功后计数（缓存命中不计数）
         """
         self.client = OpenAI(
             api_key=api_key,
@@ -31,67 +130,184 @@ class APICaller:
         )
         self.api_key = api_key
         self.api_base = api_base
+        self.cache = cache
+        self.compressor = compressor
+        self.budget = budget
+        self.cost_analyzer = CostAnalyzer()
+        # 每个 (项目, 模型) 一个令牌桶，主动平滑请求速率
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
         logging.info("APICaller initialized with DeepSeek API.")
 
-    @retry(
-        wait=wait_exponential(multiplier=1, min=4, max=10), # 指数退避，等待时间从4秒开始，最大10秒
-        stop=stop_after_attempt(5), # 最多重试5次
-        retry=retry_if_exception_type((APIConnectionError, APITimeoutError, APIStatusError)), # 仅对连接、超时或状态错误重试
-        before_sleep=lambda retry_state: logging.warning(
-            f"API call failed ({retry_state.outcome.exception()}), retrying... (attempt {retry_state.attempt_number})"
-        )
-    )
-    def _call_deepseek_api(self, messages: list, model: str = "deepseek-chat", max_tokens: int = 2048, response_format: dict = {"type": "json_object"}):
+    @classmethod
+    def circuit_open(cls) -> bool:
+        """
+        全局熔断器当前是否处于 OPEN 状态。
+        """
+        return cls._breaker.is_open()
+
+    @classmethod
+    def wait_for_circuit(cls) -> None:
+        """
+        如果熔断器处于 OPEN 状态，阻塞等待直到允许半开探测，避免直接丢弃后续待分析的任务。
+        """
+        remaining = cls._breaker.remaining_open_s()
+        if remaining > 0:
+            logging.warning(f"Circuit breaker is OPEN. Waiting {remaining:.1f}s before probing the API again.")
+            time.sleep(remaining)
+
+    @staticmethod
+    def _acquire_circuit():
+        if not APICaller._breaker.allow_request():
+            logging.error("Circuit breaker open. Skipping API call.")
+            raise RuntimeError("API Circuit Breaker Open")
+
+    @staticmethod
+    def _record_api_success():
+        APICaller._breaker.record_success()
+
+    @staticmethod
+    def _record_api_failure(e: Exception):
+        """
+        记录一次失败的API调用。只有服务端不可用类错误计入熔断，其余错误仅归还探测名额。
+        """
+        if isinstance(e, (APIConnectionError, APITimeoutError, APIStatusError)):
+            logging.error(f"DeepSeek API error: {e}")
+        else:
+            logging.error(f"An unexpected error occurred during API call: {e}")
+        if _counts_as_breaker_failure(e):
+            APICaller._breaker.record_failure()
+        else:
+            APICaller._breaker.release()
+
+    def _bucket(self, project_name: Optional[str], model: str) -> TokenBucket:
         """
-        实际调用DeepSeek Chat Completion API的方法，受tenacity装饰器保护。
+        获取 (项目, 模型) 对应的令牌桶，不存在时按 REQUESTS_PER_SECOND / RATE_LIMIT_BURST 创建。
         """
-        if APICaller._circuit_breaker_tripped:
-            logging.error("Circuit breaker tripped. Skipping API call.")
-            raise RuntimeError("API Circuit Breaker Tripped")
+        key = (project_name, model)
+        with self._buckets_lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(REQUESTS_PER_SECOND, RATE_LIMIT_BURST)
+                self._buckets[key] = bucket
+            return bucket
+
+    def _record_usage(self, model: str, response) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.cost_analyzer.record(model, usage.prompt_tokens, usage.completion_tokens)
+
+    @retry(**_RETRY_POLICY)
+    def _call_deepseek_api(self, messages: list, model: str = "deepseek-chat", max_tokens: int = 2048, response_format: dict = {"type": "json_object"},
+                           project_name: Optional[str] = None):
+        """
+        实际调用DeepSeek Chat Completion API的方法，受tenacity装饰器保护。每次尝试（含重试）都先从令牌桶取令牌。
+        """
+        self._bucket(project_name, model).acquire()
+        APICaller._acquire_circuit()
 
         logging.debug(f"Calling DeepSeek API with model: {model}, messages: {messages[:1]}")
         try:
             response = self.client.chat.completions.create(
                 model=model,
                 messages=messages,
-                max_tokens=max_tokens,
-                temperature=0.7,
-                response_format=response_format
+                **self._completion_params(model, max_tokens, response_format)
             )
-            # 如果成功，重置连续错误计数
-            APICaller._consecutive_api_errors = 0
-            return response.choices[0].message.content
-        except (APIConnectionError, APITimeoutError, APIStatusError) as e:
-            APICaller._consecutive_api_errors += 1
-            logging.error(f"DeepSeek API error: {e}. Consecutive errors: {APICaller._consecutive_api_errors}")
-            if APICaller._consecutive_api_errors >= MAX_API_ERROR_COUNT:
-                APICaller._circuit_breaker_tripped = True
-                logging.critical(f"Consecutive API errors reached {MAX_API_ERROR_COUNT}. Circuit breaker tripped. Terminating further API calls.")
-            raise # 重新抛出异常，让tenacity捕获并重试
+            APICaller._record_api_success()
+            self._record_usage(model, response)
+            choice = response.choices[0]
+            # 推理模型的思维链在 reasoning_content 中单独返回，只用于排查，最终回答仍取 content
+            reasoning = getattr(choice.message, "reasoning_content", None)
+            if reasoning:
+                logging.debug(f"{model} reasoning ({len(reasoning)} chars): {reasoning[:500]}")
+            if choice.finish_reason == "length":
+                logging.warning(f"{model} response was truncated at max_tokens.")
+            return choice.message.content
         except Exception as e:
-            logging.error(f"An unexpected error occurred during API call: {e}")
-            APICaller._consecutive_api_errors += 1
-            if APICaller._consecutive_api_errors >= MAX_API_ERROR_COUNT:
-                APICaller._circuit_breaker_tripped = True
-                logging.critical(f"Consecutive API errors reached {MAX_API_ERROR_COUNT}. Circuit breaker tripped. Terminating further API calls.")
-            raise
+            APICaller._record_api_failure(e)
+            raise # 重新抛出异常，让tenacity捕获并重试
+
+    @staticmethod
+    def _completion_params(model: str, max_tokens: int, response_format: dict) -> Dict[str, object]:
+        """
+        按模型生成请求参数：推理模型不接受 temperature，也不使用 JSON 输出模式（其输出由 call_llm 校验），
+        且需要更大的 max_tokens 才能在推理之后给出完整回答。
+        """
+        if model == COMPLEX_MODEL:
+            return {"max_tokens": max(max_tokens, COMPLEX_MODEL_MAX_TOKENS)}
+        return {"max_tokens": max_tokens, "temperature": DEFAULT_MODEL_TEMPERATURE, "response_format": response_format}
+
+    def _check_budget(self, project_name: Optional[str]) -> None:
+        """
+        :raises BudgetExceeded: 项目的 API 调用额度已用完。
+        """
+        if self.budget is not None and project_name:
+            self.budget.check(project_name)
 
-    def call_llm(self, messages: list, model: str = "deepseek-chat", max_tokens: int = 2048, response_format: dict = {"type": "json_object"}):
+    def _charge_budget(self, project_name: Optional[str]) -> None:
+        if self.budget is not None and project_name:
+            self.budget.increment(project_name)
+
+    def _prepare_request(self, messages: list, model: Optional[str], max_tokens: int, response_format: dict, task_type: Optional[str]):
+        """
+        请求前置处理：熔断检查、Prompt压缩、模型路由与缓存查询。
+        :return: (压缩后的messages, 模型名, 缓存键, 缓存命中的内容或None)
+        :raises RuntimeError: 如果熔断器处于打开状态
         """
-        公共方法，用于调用LLM，会触发重试和熔断逻辑。
+        if APICaller.circuit_open():
+            logging.error("Attempted to call LLM while circuit breaker is open.")
+            raise RuntimeError("API Circuit Breaker Open: Cannot make further API calls.")
+
+        if self.compressor is not None:
+            messages = self.compressor.compress(messages)
+        if model is None:
+            model = select_model_by_complexity(messages, task_type)
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = LLMCache.get_key(messages, model, max_tokens, response_format)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logging.debug(f"LLM cache hit: {cache_key[:12]}")
+                return messages, model, cache_key, cached
+        return messages, model, cache_key, None
+
+    def call_llm(self, messages: list, model: Optional[str] = None, max_tokens: int = 2048, response_format: dict = {"type": "json_object"},
+                 task_type: Optional[str] = None, project_name: Optional[str] = None):
+        """
+        公共方法，用于调用LLM，会触发限速、重试和熔断逻辑。
         :param messages: 聊天消息列表
-        :param model: 使用的LLM模型
+        :param model: 使用的LLM模型，为None时按任务复杂度自动选择
         :param max_tokens: 最大生成tokens
         :param response_format: 响应格式，默认为JSON对象
+        :param task_type: 任务类型（如 'judge'、'code_fix'、'deep_triage'），用于模型路由
+        :param project_name: 发起调用的项目，用于按 (项目, 模型) 限速
         :return: LLM的响应内容
-        :raises RuntimeError: 如果熔断器被触发
+        :raises RuntimeError: 如果熔断器处于打开状态
+        :raises BudgetExceeded: 如果项目的 API 调用额度已用完
         """
-        if APICaller._circuit_breaker_tripped:
-            logging.error("Attempted to call LLM while circuit breaker is tripped.")
-            raise RuntimeError("API Circuit Breaker Tripped: Cannot make further API calls.")
+        messages, model, cache_key, cached = self._prepare_request(messages, model, max_tokens, response_format, task_type)
+        if cached is not None:
+            return cached
+        self._check_budget(project_name)
 
         try:
-            return self._call_deepseek_api(messages, model, max_tokens, response_format)
+            content = self._call_deepseek_api(messages, model, max_tokens, response_format, project_name)
+            self._charge_budget(project_name)
+            # 推理模型不走 JSON 输出模式：要求 JSON 时校验其回答，取不到完整的 JSON 对象就改用对话模型重试一次
+            if model == COMPLEX_MODEL and response_format and response_format.get("type") == "json_object":
+                json_text = _extract_json_object(content)
+                if json_text is not None:
+                    content = json_text
+                else:
+                    logging.warning(f"{model} returned no valid JSON object, falling back to {DEFAULT_MODEL}.")
+                    self._check_budget(project_name)
+                    content = self._call_deepseek_api(messages, DEFAULT_MODEL, max_tokens, response_format, project_name)
+                    self._charge_budget(project_name)
         except Exception as e:
             logging.error(f"Failed to call LLM after retries or due to critical error: {e}")
             raise
+
+        if cache_key is not None and content:
+            self.cache.set(cache_key, content)
+        return content
@@ -0,0 +1,104 @@
+
+import os
+import logging
+import threading
+from collections import Counter
+
+# 从配置中导入常量
+from MassAudit_Pro.config import MAX_CALLS_PER_PROJECT, CALL_BUDGET_PATH, CALL_BUDGET_FLUSH_EVERY
+from MassAudit_Pro.utils import json_utils
+
+class BudgetExceeded(Exception):
+    """
+    项目的 API 调用次数已达到上限。
+    """
+    def __init__(self, project_name: str, used: int, limit: int):
+        super().__init__(f"Project {project_name} hit API call limit ({used}/{limit}).")
+        self.project_name = project_name
+        self.used = used
+        self.limit = limit
+
+class CallBudget:
+    """
+    线程安全的项目级 API 调用计数器，可在多线程/多协程间共享。
+    计数定期原子落盘（写临时文件后 os.replace），中断后重新运行可接着使用已消耗的额度。
+    """
+    def __init__(self, path: str = CALL_BUDGET_PATH, limit: int = MAX_CALLS_PER_PROJECT, flush_every: int = CALL_BUDGET_FLUSH_EVERY):
+        """
+        初始化CallBudget。
+        :param path: 计数持久化文件路径，为空时只在内存中计数。
+        :param limit: 单个项目允许的最大API调用次数。
+        :param flush_every: 每累计多少次调用落盘一次。
+        """
+        self.path = path
+        self.limit = limit
+        self.flush_every = max(1, flush_every)
+        self._counts: Counter = Counter()
+        self._dirty = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                self._counts.update(json_utils.load_file(path))
+                logging.info(f"Loaded API call budget from {path}: {dict(self._counts)}")
+            except (OSError, ValueError, TypeError) as e:
+                logging.warning(f"Ignoring unreadable call budget file {path}: {e}")
+
+    def count(self, project_name: str) -> int:
+        with self._lock:
+            return self._counts[project_name]
+
+    def remaining(self, project_name: str) -> int:
+        return max(0, self.limit - self.count(project_name))
+
+    def exhausted(self, project_name: str) -> bool:
+        return self.remaining(project_name) <= 0
+
+    def check(self, project_name: str) -> None:
+        """
+        :raises BudgetExceeded: 项目额度已用完。
+        """
+        used = self.count(project_name)
+        if used >= self.limit:
+            raise BudgetExceeded(project_name, used, self.limit)
+
+    def increment(self, project_name: str) -> int:
+        """
+        记录一次调用，返回该项目累计的调用次数。
+        """
+        with self._lock:
+            self._counts[project_name] += 1
+            used = self._counts[project_name]
+            self._dirty += 1
+            should_flush = self._dirty >= self.flush_every
+        if should_flush:
+            self.flush()
+        return used
+
+    def reset(self, project_name: str) -> None:
+        """
+        清零某个项目的计数（重新扫描项目时使用）。
+        """
+        with self._lock:
+            self._counts.pop(project_name, None)
+            self._dirty += 1
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        将计数原子写入磁盘。
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json_utils.dumps(dict(self._counts), sort_keys=True, indent=True)
+            self._dirty = 0
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.warning(f"Failed to persist call budget to {self.path}: {e}")
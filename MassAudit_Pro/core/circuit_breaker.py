@@ -0,0 +1,103 @@
+
+import time
+import logging
+import threading
+
+class CircuitBreaker:
+    """
+    三态熔断器 CLOSED / OPEN / HALF_OPEN。
+    - CLOSED: 正常放行，连续失败达到阈值后转为 OPEN。
+    - OPEN: 快速拒绝所有请求；超过 reset_timeout_s 后转为 HALF_OPEN。
+    - HALF_OPEN: 最多放行 half_open_max_calls 个探测请求，成功则恢复 CLOSED，失败则重新 OPEN。
+    """
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, failure_threshold: int, reset_timeout_s: float, half_open_max_calls: int = 3):
+        """
+        初始化CircuitBreaker。
+        :param failure_threshold: 触发熔断的连续失败次数。
+        :param reset_timeout_s: OPEN 状态持续多久后允许探测（秒）。
+        :param half_open_max_calls: HALF_OPEN 状态下同时在途的探测请求上限。
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CircuitBreaker.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_inflight = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        # 调用方需持有锁
+        if self._state == CircuitBreaker.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+            self._state = CircuitBreaker.HALF_OPEN
+            self._half_open_inflight = 0
+            logging.warning("Circuit breaker entering HALF_OPEN state. Probing API availability.")
+
+    def _trip(self) -> None:
+        # 调用方需持有锁
+        self._state = CircuitBreaker.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_inflight = 0
+        logging.critical(f"Circuit breaker OPEN after {self._consecutive_failures} consecutive API errors. "
+                         f"Rejecting API calls for {self.reset_timeout_s}s.")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def is_open(self) -> bool:
+        """
+        熔断器是否处于 OPEN 状态（不消耗 HALF_OPEN 的探测名额）。
+        """
+        return self.state == CircuitBreaker.OPEN
+
+    def remaining_open_s(self) -> float:
+        """
+        距离进入 HALF_OPEN 还需等待的秒数，非 OPEN 状态返回0。
+        """
+        with self._lock:
+            self._refresh()
+            if self._state != CircuitBreaker.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout_s - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """
+        判断是否放行一次请求。HALF_OPEN 状态下放行会占用一个探测名额。
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == CircuitBreaker.CLOSED:
+                return True
+            if self._state == CircuitBreaker.HALF_OPEN and self._half_open_inflight < self.half_open_max_calls:
+                self._half_open_inflight += 1
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                logging.info("Circuit breaker probe succeeded. State back to CLOSED.")
+            self._state = CircuitBreaker.CLOSED
+            self._consecutive_failures = 0
+            self._half_open_inflight = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == CircuitBreaker.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._trip()
+
+    def release(self) -> None:
+        """
+        请求以不计入熔断的方式结束（例如 4xx），仅归还 HALF_OPEN 的探测名额。
+        """
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN and self._half_open_inflight > 0:
+                self._half_open_inflight -= 1
@@ -1,14 +1,132 @@
 
 import os
-import subprocess
+import mmap
+import asyncio
 import shlex
-import json
+import signal
+import subprocess
 import logging
 import shutil
-from typing import Optional, List, Dict, Any
+import hashlib
+import threading
+from collections import Counter, deque
+from typing import Optional, List, Dict, Any, Iterator
+
+try:
+    import ijson
+except ImportError: # ijson 为可选依赖，缺失时退化为一次性解析
+    ijson = None
 
 # 从配置中导入常量
-from MassAudit_Pro.config import PROJECTS_ROOT, DB_STORAGE
+from MassAudit_Pro.utils import json_utils
+from MassAudit_Pro.config import PROJECTS_ROOT, DB_STORAGE, SARIF_STREAM_THRESHOLD_MB, CODEQL_COMMAND_TIMEOUT_S, COMMAND_OUTPUT_TAIL_LINES, COMMAND_DRAIN_TIMEOUT_S, CODEQL_RESOLVE_TIMEOUT_S, LANG_DETECT_SAMPLE_LIMIT, LANG_DETECT_DOMINANCE, LANG_DETECT_DOMINANCE_MIN_FILES
+
+# 扩展名 -> 语言 的扁平映射，模块加载时构建一次
+EXT_TO_LANG = {
+    '.py': 'python',
+    '.go': 'go',
+    '.java': 'java', '.gradle': 'java', '.jar': 'java', # Include build files for Java projects
+    '.js': 'javascript', '.jsx': 'javascript', '.ts': 'javascript', '.tsx': 'javascript', '.mjs': 'javascript', '.cjs': 'javascript',
+    '.cs': 'csharp',
+    '.c': 'cpp', '.cpp': 'cpp', '.h': 'cpp', '.hpp': 'cpp',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.kt': 'kotlin', '.kts': 'kotlin',
+    '.swift': 'swift',
+    '.scala': 'scala',
+}
+# 语言识别时不进入的目录
+SKIP_DIRS = frozenset({'.git', 'node_modules', 'vendor', '__pycache__'})
+
+# asyncio 子进程按行读取时单行的最大长度
+_STREAM_LINE_LIMIT = 1024 * 1024
+
+async def _pump(stream: asyncio.StreamReader, log_func, tail: deque) -> None:
+    """
+    逐行读取子进程输出流，实时写入日志并保留末尾若干行。
+    """
+    while True:
+        try:
+            raw = await stream.readline()
+        except ValueError: # 单行超过 _STREAM_LINE_LIMIT，超出部分已被丢弃
+            continue
+        if not raw:
+            break
+        line = raw.decode('utf-8', 'replace').rstrip()
+        if line:
+            log_func(line)
+            tail.append(line)
+
+def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """
+    终止子进程所在的整个进程组（子进程以 start_new_session=True 启动，进程组号即其 pid）。
+    """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def _sarif_may_have_results(sarif_file_path: str) -> bool:
+    """
+    通过 mmap 在原始字节中查找 "ruleId"，判断 SARIF 是否可能包含 result。
+    CodeQL 输出的每条 result 都带 ruleId，而规则元数据（tool.driver.rules）中只有 id，
+    因此找不到 "ruleId" 即可确定结果为空，无需解析动辄数 MB 的规则描述。无法判断时返回True。
+    """
+    try:
+        with open(sarif_file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return True # 空文件交给解析流程按损坏处理
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm.find(b'"ruleId"') >= 0
+    except (OSError, ValueError):
+        return True
+
+def _iter_file_extensions(path: str) -> Iterator[str]:
+    """
+    基于 os.scandir 递归遍历目录，逐个产出文件的小写扩展名（跳过 SKIP_DIRS 与符号链接目录）。
+    """
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIP_DIRS:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield os.path.splitext(entry.name)[1].lower()
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.debug(f"Cannot scan directory {current}: {e}")
+
+def _source_tree_digest(path: str) -> Optional[str]:
+    """
+    以源码树中所有文件的相对路径、大小与 mtime 计算指纹（跳过 .git），用于判断 SARIF 缓存是否失效。
+    只读取目录项元数据，不读取文件内容。
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            return None
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != '.git':
+                        stack.append(entry.path)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            digest.update(f"{os.path.relpath(entry.path, path)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
 
 class CodeQLManager:
     """
@@ -24,33 +142,36 @@ class CodeQLManager:
         self.projects_root = projects_root
         # 确保数据库存储路径存在
         os.makedirs(self.db_storage_path, exist_ok=True)
+        self.lang_cache_path = os.path.join(self.db_storage_path, "lang_cache.json")
+        self._lang_cache_lock = threading.Lock()
+        self._lang_cache = None # lang_cache.json 的内存副本，首次查询时加载
+        self.sarif_cache_dir = os.path.join(self.db_storage_path, "sarif_cache")
+        self._toolchain_lock = threading.Lock()
+        self._cli_version = None # `codeql version` 的输出，首次计算缓存键时读取
+        self._pack_versions: Dict[str, str] = {} # 查询包名 -> 解析到的包路径（路径中含版本号）
         logging.info(f"CodeQLManager initialized. DB storage: {self.db_storage_path}, Projects root: {self.projects_root}")
 
-    def _run_command(self, command_args: List[str], cwd: Optional[str] = None) -> Optional[str]:
+    async def _run_command(self, command_args: List[str], cwd: Optional[str] = None) -> Optional[str]:
         """
-        安全地执行Shell命令，并捕获输出和错误。
+        安全地执行Shell命令，实时转发输出到日志，并捕获输出和错误。
+        [修改] 基于 asyncio 子进程实现，多个项目的 CodeQL 命令可在同一事件循环中并发执行；
+        输出按行流式转发，内存中只保留最后 COMMAND_OUTPUT_TAIL_LINES 行。
+        命令在独立的进程组中运行，超时或被取消时终止整个进程组：CodeQL 启动的提取器与构建子进程一并结束，
+        不会残留进程或一直占用输出管道。
         :param command_args: 命令及其参数的列表。
         :param cwd: 执行命令的工作目录。
-        :return: 命令的标准输出，如果执行失败则返回None。
+        :return: 命令标准输出的最后若干行，如果执行失败则返回None。
         """
         try:
             logging.debug(f"Executing command: {' '.join(shlex.quote(arg) for arg in command_args)} in cwd: {cwd}")
-            process = subprocess.run(
-                command_args,
+            process = await asyncio.create_subprocess_exec(
+                *command_args,
                 cwd=cwd,
-                capture_output=True,
-                text=True,
-                check=True, # Raise an exception for non-zero exit codes
-                encoding='utf-8'
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=_STREAM_LINE_LIMIT,
+                start_new_session=True
             )
-            if process.stderr:
-                logging.warning(f"Command stderr: {process.stderr.strip()}")
-            return process.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Command failed with exit code {e.returncode}: {e.cmd}")
-            logging.error(f"Stdout: {e.stdout}")
-            logging.error(f"Stderr: {e.stderr}")
-            return None
         except FileNotFoundError:
             logging.error(f"Command not found. Is CodeQL CLI installed and in PATH? Command: {command_args[0]}")
             return None
@@ -58,50 +179,126 @@ class CodeQLManager:
             logging.error(f"An unexpected error occurred while running command: {command_args}. Error: {e}")
             return None
 
+        stdout_tail = deque(maxlen=COMMAND_OUTPUT_TAIL_LINES)
+        stderr_tail = deque(maxlen=COMMAND_OUTPUT_TAIL_LINES)
+        pumps = asyncio.gather(
+            _pump(process.stdout, logging.info, stdout_tail),
+            _pump(process.stderr, logging.warning, stderr_tail),
+        )
+        try:
+            returncode = await asyncio.wait_for(process.wait(), timeout=CODEQL_COMMAND_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            _kill_process_group(process)
+            await process.wait()
+            logging.error(f"Command timed out after {CODEQL_COMMAND_TIMEOUT_S}s and was killed: {command_args}")
+            return None
+        except BaseException: # 任务被取消（关闭）等情况，不能让 CodeQL 在后台继续运行
+            _kill_process_group(process)
+            raise
+        finally:
+            # 子进程已退出或已被终止，管道应很快关闭；限时等待读取结束，避免脱离进程组的孙进程一直持有管道而卡住
+            try:
+                await asyncio.wait_for(pumps, timeout=COMMAND_DRAIN_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                logging.warning(f"Output pipes still open {COMMAND_DRAIN_TIMEOUT_S}s after command exited, stopped reading: {command_args}")
+
+        if returncode != 0:
+            stdout_text = "\n".join(stdout_tail)
+            stderr_text = "\n".join(stderr_tail)
+            logging.error(f"Command failed with exit code {returncode}: {command_args}")
+            logging.error(f"Stdout (tail): {stdout_text}")
+            logging.error(f"Stderr (tail): {stderr_text}")
+            return None
+        return "\n".join(stdout_tail).strip()
+
+    @staticmethod
+    def _project_fingerprint(full_project_path: str) -> Optional[str]:
+        """
+        以项目顶层条目的名称与 mtime 计算廉价指纹，用于判断语言识别缓存是否失效。
+        """
+        try:
+            with os.scandir(full_project_path) as it:
+                stamps = sorted(f"{entry.name}:{entry.stat(follow_symlinks=False).st_mtime_ns}" for entry in it)
+        except OSError:
+            return None
+        return hashlib.blake2b("|".join(stamps).encode('utf-8', 'ignore'), digest_size=16).hexdigest()
+
+    def _load_lang_cache(self) -> Dict[str, Any]:
+        try:
+            return json_utils.load_file(self.lang_cache_path)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable language cache {self.lang_cache_path}: {e}")
+            return {}
+
     def _detect_language(self, project_path: str) -> Optional[str]:
         """
         动态识别项目的主要编程语言。
+        [新增] 结果按 (项目路径, 顶层mtime指纹) 缓存到 db_storage_path/lang_cache.json，项目未变化时无需重新遍历。
+        缓存文件在进程内只加载一次，之后的查询直接使用内存副本。
         :param project_path: 项目的绝对路径。
         :return: 识别到的语言（如 'python', 'go', 'java', 'javascript'），如果无法识别则返回None。
         """
-        language_extensions = {
-            'python': ['.py'],
-            'go': ['.go'],
-            'java': ['.java', '.gradle', '.jar'], # Include build files for Java projects
-            'javascript': ['.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs'],
-            'csharp': ['.cs'],
-            'cpp': ['.c', '.cpp', '.h', '.hpp'],
-            'ruby': ['.rb'],
-            'php': ['.php'],
-            'kotlin': ['.kt', '.kts'],
-            'swift': ['.swift'],
-            'scala': ['.scala']
-        }
-
-        found_languages = {}
-
         full_project_path = os.path.join(self.projects_root, project_path)
         if not os.path.isdir(full_project_path):
             logging.warning(f"Project path does not exist or is not a directory: {full_project_path}")
             return None
 
-        for root, _, files in os.walk(full_project_path):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                for lang, extensions in language_extensions.items():
-                    if ext in extensions:
-                        found_languages[lang] = found_languages.get(lang, 0) + 1
+        fingerprint = self._project_fingerprint(full_project_path)
+        with self._lang_cache_lock:
+            if self._lang_cache is None:
+                self._lang_cache = self._load_lang_cache()
+            cached = self._lang_cache.get(full_project_path)
+        if fingerprint and cached and cached.get("fingerprint") == fingerprint:
+            logging.info(f"Using cached language for project '{project_path}': {cached.get('language')}")
+            return cached.get("language")
+
+        language = self._scan_language(full_project_path, project_path)
+        if fingerprint:
+            with self._lang_cache_lock:
+                # 写入前重新读取磁盘上的缓存，合并其他分片进程写入的条目
+                cache = self._load_lang_cache()
+                cache[full_project_path] = {"fingerprint": fingerprint, "language": language}
+                self._lang_cache = cache
+                try:
+                    tmp_path = self.lang_cache_path + ".tmp"
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.write(json_utils.dumps(cache, indent=True))
+                    os.replace(tmp_path, self.lang_cache_path)
+                except OSError as e:
+                    logging.warning(f"Failed to write language cache {self.lang_cache_path}: {e}")
+        return language
+
+    def _scan_language(self, full_project_path: str, project_path: str) -> Optional[str]:
+        """
+        遍历项目源码并采样统计，返回文件数量最多的语言。
+        """
+        found_languages = Counter()
+        sampled = 0
+        for ext in _iter_file_extensions(full_project_path):
+            lang = EXT_TO_LANG.get(ext)
+            if lang is None:
+                continue
+            found_languages[lang] += 1
+            sampled += 1
+            if sampled >= LANG_DETECT_SAMPLE_LIMIT:
+                logging.debug(f"Language detection for '{project_path}' stopped after sampling {sampled} files.")
+                break
+            count = found_languages[lang]
+            if count >= LANG_DETECT_DOMINANCE_MIN_FILES and count >= sampled * LANG_DETECT_DOMINANCE:
+                break
 
         if not found_languages:
             logging.info(f"No primary language detected for project: {project_path}")
             return None
 
         # 返回文件数量最多的语言作为主语言
-        dominant_language = max(found_languages, key=found_languages.get)
-        logging.info(f"Detected dominant language for project '{project_path}': {dominant_language} with {found_languages[dominant_language]} files.")
+        dominant_language, file_count = found_languages.most_common(1)[0]
+        logging.info(f"Detected dominant language for project '{project_path}': {dominant_language} with {file_count} sampled files.")
         return dominant_language
 
-    def create_database(self, project_name: str, project_path: str, language: str) -> Optional[str]:
+    async def create_database(self, project_name: str, project_path: str, language: str) -> Optional[str]:
         """
         安全地创建CodeQL数据库。
         :param project_name: 项目的名称，用于数据库命名。
@@ -118,7 +315,7 @@ class CodeQLManager:
         if os.path.exists(db_path):
             logging.warning(f"Existing CodeQL database found at '{db_path}'. Deleting it before creation.")
             try:
-                shutil.rmtree(db_path)
+                await asyncio.to_thread(shutil.rmtree, db_path)
             except Exception as e:
                 logging.error(f"Failed to remove existing database at {db_path}: {e}")
                 return None
@@ -140,7 +337,7 @@ class CodeQLManager:
         elif language == 'python':
             pass # Python projects typically don't require an explicit build command for CodeQL
 
-        stdout = self._run_command(command)
+        stdout = await self._run_command(command)
 
         if stdout:
             logging.info(f"Successfully created CodeQL database for '{project_name}': {db_path}")
@@ -149,7 +346,7 @@ class CodeQLManager:
             logging.error(f"Failed to create CodeQL database for '{project_name}'.")
             return None
 
-    def run_analysis(self, db_path: str, query_pack: str = 'codeql/java-queries', output_sarif_path: str = None) -> Optional[str]:
+    async def run_analysis(self, db_path: str, query_pack: str = 'codeql/java-queries', output_sarif_path: str = None) -> Optional[str]:
         """
         安全地执行CodeQL分析。
         :param db_path: CodeQL数据库的绝对路径。
@@ -174,7 +371,7 @@ class CodeQLManager:
             f"--output={output_sarif_path}"
         ]
 
-        stdout = self._run_command(command)
+        stdout = await self._run_command(command)
 
         if stdout:
             logging.info(f"Successfully completed CodeQL analysis. SARIF results: {output_sarif_path}")
@@ -183,11 +380,116 @@ class CodeQLManager:
             logging.error(f"Failed to run CodeQL analysis on database '{db_path}'.")
             return None
 
-    def parse_sarif_results(self, sarif_file_path: str) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _run_codeql_query(command_args: List[str]) -> Optional[str]:
+        """
+        同步执行一条只读的 CodeQL 查询命令（版本、包解析等），失败时返回None。
+        """
+        try:
+            completed = subprocess.run(command_args, capture_output=True, text=True, errors='replace', timeout=CODEQL_RESOLVE_TIMEOUT_S)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.warning(f"Failed to run {command_args}: {e}")
+            return None
+        if completed.returncode != 0:
+            logging.warning(f"Command failed with exit code {completed.returncode}: {command_args}: {completed.stderr.strip()}")
+            return None
+        return completed.stdout.strip()
+
+    def _toolchain_fingerprint(self, query_pack: str) -> Optional[str]:
+        """
+        CodeQL CLI 版本与查询包解析路径组成的指纹，CLI 或查询包升级后 SARIF 缓存随之失效。
+        CLI 版本每个进程只读取一次；查询包尚未下载（无法解析）时返回None，本次不使用缓存。
+        """
+        with self._toolchain_lock:
+            if self._cli_version is None:
+                self._cli_version = self._run_codeql_query(["codeql", "version", "--format=terse"])
+            cli_version = self._cli_version
+            pack_version = self._pack_versions.get(query_pack)
+        if cli_version is None:
+            return None
+        if pack_version is None:
+            stdout = self._run_codeql_query(["codeql", "resolve", "qlpacks", "--format=json"])
+            try:
+                pack_paths = json_utils.loads(stdout).get(query_pack) if stdout else None
+            except (json_utils.JSONDecodeError, AttributeError):
+                pack_paths = None
+            if not pack_paths:
+                logging.info(f"Query pack '{query_pack}' is not resolved locally yet, SARIF cache skipped for this run.")
+                return None
+            pack_version = "|".join(sorted(pack_paths if isinstance(pack_paths, list) else [str(pack_paths)]))
+            with self._toolchain_lock:
+                self._pack_versions[query_pack] = pack_version
+        return f"{cli_version}|{pack_version}"
+
+    def sarif_cache_key(self, project_path: str, language: str, query_pack: str) -> Optional[str]:
+        """
+        计算项目 SARIF 缓存的键：CodeQL 版本、语言、查询包（含解析到的版本）与源码树指纹共同决定扫描结果。
+        :param project_path: 项目相对于 self.projects_root 的路径。
+        :return: 缓存键，无法遍历源码树或无法确定 CodeQL/查询包版本时返回None。
+        """
+        toolchain = self._toolchain_fingerprint(query_pack)
+        if toolchain is None:
+            return None
+        tree_digest = _source_tree_digest(os.path.join(self.projects_root, project_path))
+        if tree_digest is None:
+            return None
+        return hashlib.blake2b(f"{toolchain}|{language}|{query_pack}|{tree_digest}".encode('utf-8'), digest_size=16).hexdigest()
+
+    def get_cached_sarif(self, project_name: str, cache_key: str) -> Optional[str]:
+        """
+        :return: 与缓存键匹配的 SARIF 文件路径，未命中返回None。
+        """
+        cached_path = os.path.join(self.sarif_cache_dir, project_name, f"{cache_key}.sarif")
+        return cached_path if os.path.isfile(cached_path) else None
+
+    def store_sarif(self, project_name: str, cache_key: str, sarif_file_path: str) -> None:
+        """
+        将扫描生成的 SARIF 复制到缓存（数据库目录在审计结束后会被删除），并删除该项目的旧缓存。
+        """
+        project_cache_dir = os.path.join(self.sarif_cache_dir, project_name)
+        cache_name = f"{cache_key}.sarif"
+        try:
+            os.makedirs(project_cache_dir, exist_ok=True)
+            tmp_path = os.path.join(project_cache_dir, cache_name + ".tmp")
+            shutil.copyfile(sarif_file_path, tmp_path)
+            os.replace(tmp_path, os.path.join(project_cache_dir, cache_name))
+            with os.scandir(project_cache_dir) as it:
+                stale = [entry.path for entry in it if entry.name != cache_name]
+            for path in stale:
+                os.remove(path)
+        except OSError as e:
+            logging.warning(f"Failed to cache SARIF for project '{project_name}': {e}")
+
+    def iter_sarif_results(self, sarif_file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        逐条产出 SARIF 文件中所有 run 的 result。
+        大文件使用 ijson 事件流解析，峰值内存只与单条结果相关；小文件（或未安装 ijson 时）用 orjson 一次性解析。
+        不含任何 result 的 SARIF 在解析前即被识别并跳过。
+        :param sarif_file_path: SARIF文件的绝对路径。
+        :raises ValueError: 文件损坏或JSON格式错误。
+        """
+        if not _sarif_may_have_results(sarif_file_path):
+            logging.info(f"SARIF file {sarif_file_path} contains no results. Skipping parse.")
+            return
+
+        if ijson is not None and os.path.getsize(sarif_file_path) > SARIF_STREAM_THRESHOLD_MB * 1024 * 1024:
+            with open(sarif_file_path, 'rb') as f:
+                try:
+                    yield from ijson.items(f, 'runs.item.results.item', use_float=True)
+                except ijson.JSONError as e:
+                    raise ValueError(str(e)) from e
+            return
+
+        sarif_content = json_utils.load_file(sarif_file_path)
+        for run in sarif_content.get('runs') or []:
+            yield from run.get('results', [])
+
+    def parse_sarif_results(self, sarif_file_path: str) -> Optional[List[Dict[str, Any]]]:
         """
         解析CodeQL生成的SARIF文件。
+        [修改] 只返回 results 列表而不是整个 SARIF 文档，大文件流式解析，避免整份 SARIF 驻留内存。
         :param sarif_file_path: SARIF文件的绝对路径。
-        :return: 解析后的SARIF内容（字典），如果文件损坏或JSON格式错误则返回None。
+        :return: 所有 run 的 result 列表，如果文件损坏或JSON格式错误则返回None。
         """
         if not os.path.exists(sarif_file_path):
             logging.error(f"SARIF file not found at: {sarif_file_path}")
@@ -195,11 +497,10 @@ class CodeQLManager:
 
         logging.info(f"Attempting to parse SARIF file: {sarif_file_path}")
         try:
-            with open(sarif_file_path, 'r', encoding='utf-8') as f:
-                sarif_content = json.load(f)
-            logging.info(f"Successfully parsed SARIF file: {sarif_file_path}")
-            return sarif_content
-        except json.JSONDecodeError as e:
+            results = list(self.iter_sarif_results(sarif_file_path))
+            logging.info(f"Successfully parsed SARIF file: {sarif_file_path} ({len(results)} results)")
+            return results
+        except ValueError as e: # json.JSONDecodeError 是 ValueError 的子类
             logging.error(f"SARIF file '{sarif_file_path}' is corrupted or has invalid JSON format: {e}. Skipping this file.")
             return None
         except Exception as e:
@@ -1,44 +1,231 @@
 import os
 import re
+import mmap
+import hashlib
+import itertools
+import shutil
+import textwrap
 import logging
-from typing import Optional, Tuple, List, Any
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+from collections import OrderedDict
+from typing import Optional, Tuple, List, Dict, Any, Pattern
 
 # 从配置中导入常量
-from MassAudit_Pro.config import PROJECTS_ROOT, FILE_SIZE_LIMIT_MB
+from MassAudit_Pro.config import PROJECTS_ROOT, DB_STORAGE, SYMBOL_INDEX_ENABLED, FILE_SIZE_LIMIT_MB, FILE_CACHE_MAX_MB, RG_TIMEOUT_S, CONTEXT_SCAN_WORKERS, PRUNE_DIRS, SKIP_FILE_SUFFIXES
+
+from MassAudit_Pro.core.symbol_index import SymbolIndex
+from MassAudit_Pro.utils import json_utils
+
+# 支持提取定义的源文件后缀
+SOURCE_EXTENSIONS = frozenset({'.go', '.py', '.js', '.java', '.cpp', '.c'})
+# 传给 ripgrep 的排除规则，与 Python 遍历的剪枝保持一致（'.*/' 排除隐藏目录）
+RG_EXCLUDE_GLOBS = tuple(itertools.chain.from_iterable(
+    ("-g", f"!{pattern}") for pattern in (*sorted(PRUNE_DIRS), '.*/', *(f"*{suffix}" for suffix in SKIP_FILE_SUFFIXES))
+))
+
+@lru_cache(maxsize=4096)
+def _python_pattern(target_name: str) -> Pattern:
+    """
+    编译并缓存 Python 定义的正则，函数定义与变量定义合并为一个带命名分组的交替式，一次扫描即可定位。
+    行首空白使用 [ \t] 而不是 \s，避免在全文 MULTILINE 搜索时跨行匹配。
+    """
+    name = re.escape(target_name)
+    return re.compile(
+        # 查找函数定义 (def function_name(...):)
+        r'(?P<func>^(?:async[ \t]+)?def[ \t]+' + name + r'[ \t]*\([^)]*\):)'
+        # 查找变量定义 (variable_name = ...)
+        r'|(?P<var>^[ \t]*' + name + r'[ \t]*=[^\n]*$)',
+        re.MULTILINE
+    )
+
+@lru_cache(maxsize=4096)
+def _go_pattern(target_name: str) -> Pattern:
+    """
+    编译并缓存 Go 定义的正则，函数/方法定义与 const/var/type 定义合并为一个带命名分组的交替式。
+    """
+    name = re.escape(target_name)
+    return re.compile(
+        # 1. 查找函数定义: func Name( | func (r *Receiver) Name(
+        r'(?P<func>^func[ \t]+(?:\([^)]+\)[ \t]+)?' + name + r'[ \t]*\()'
+        # 2. 查找 常量/变量/类型 定义: const Name = | var Name = | type Name struct
+        # 结尾的字符类确保 target_name 是完整单词，避免 minCompressBodyLength 匹配到 minCompressBodyLengthSuffix
+        r'|(?P<def>^[ \t]*(?:const|var|type)[ \t]+' + name + r'(?:[ \t]|=|:|$))',
+        re.MULTILINE
+    )
+
+class _ContentCache:
+    """
+    进程内的文件内容 LRU 缓存，以缓存内容的总字符数为上限。
+    """
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._items: "OrderedDict[tuple, str]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            content = self._items.get(key)
+            if content is not None:
+                self._items.move_to_end(key)
+            return content
+
+    def put(self, key: tuple, content: str) -> None:
+        if len(content) > self.max_chars:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total -= len(old)
+            self._items[key] = content
+            self._total += len(content)
+            while self._total > self.max_chars:
+                _, evicted = self._items.popitem(last=False)
+                self._total -= len(evicted)
+
+_content_cache = _ContentCache(FILE_CACHE_MAX_MB * 1024 * 1024)
+
+def _file_contains(file_path: str, needle: bytes) -> bool:
+    """
+    通过 mmap 在文件原始字节中查找子串（C 层扫描，不做解码）。读取失败时返回True，交由后续流程处理。
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm.find(needle) >= 0
+    except (OSError, ValueError):
+        return True
+
+def _rest_of_line_blank(content: str, pos: int) -> bool:
+    """
+    pos 到行尾之间是否只有空白或注释。
+    """
+    end = content.find('\n', pos)
+    rest = content[pos:] if end < 0 else content[pos:end]
+    rest = rest.strip()
+    return not rest or rest.startswith('//') or rest.startswith('/*')
+
+def _go_block_end(content: str, start: int) -> int:
+    """
+    从定义所在行的行首开始扫描 Go 源码，返回定义结束位置（不含）。
+    跳过 "..."、'...'、`...`、// 与 /* */ 中的内容，只统计真正的括号：
+    - 花括号与圆括号都回到0层、且其后到行尾再无代码的 '}'，即函数体/结构体的结束；
+      签名中的类型字面量（func F() interface{} {、map[string]struct{} {）闭合后同一行还有函数体，继续扫描；
+    - 括号都为0层时遇到换行，即单行定义（const X = 1）或 var (...) 分组的结束。
+    """
+    braces = parens = 0
+    i, n = start, len(content)
+    while i < n:
+        ch = content[i]
+        if ch == '"' or ch == "'":
+            i += 1
+            while i < n and content[i] != ch and content[i] != '\n':
+                i += 2 if content[i] == '\\' else 1
+        elif ch == '`':
+            close = content.find('`', i + 1)
+            i = n if close < 0 else close
+        elif content.startswith('//', i):
+            close = content.find('\n', i)
+            if close < 0:
+                return n
+            i = close
+            continue # 换行交给下一轮处理
+        elif content.startswith('/*', i):
+            close = content.find('*/', i + 2)
+            i = n if close < 0 else close + 1
+        elif ch == '{':
+            braces += 1
+        elif ch == '}':
+            braces -= 1
+            if braces <= 0 and parens <= 0 and _rest_of_line_blank(content, i + 1):
+                return i + 1
+        elif ch == '(':
+            parens += 1
+        elif ch == ')':
+            parens -= 1
+        elif ch == '\n' and braces <= 0 and parens <= 0:
+            return i
+        i += 1
+    return n
+
+def _line_start(content: str, pos: int) -> int:
+    return content.rfind('\n', 0, pos) + 1
+
+def _search_definition(pattern: Pattern, content: str, target_name: str) -> Optional[re.Match]:
+    """
+    与 pattern.search(content) 结果相同，但对普通标识符走快速路径：
+    先用 str.find 定位 target 出现的位置，只在这些行的行首尝试匹配，跳过正则对整个文件的逐字符扫描。
+    定义正则的每个分支都以 ^ 开头且 target 与定义在同一行，因此逐行 match 与全文 search 等价。
+    """
+    if not target_name.isidentifier():
+        return pattern.search(content)
+    pos = content.find(target_name)
+    while pos >= 0:
+        match = pattern.match(content, _line_start(content, pos))
+        if match is not None:
+            return match
+        line_end = content.find('\n', pos)
+        if line_end < 0:
+            return None
+        pos = content.find(target_name, line_end)
+    return None
 
 class ContextResolver:
     """
     ContextResolver 类用于在项目中查找AI请求的函数或变量定义，并提取其完整的代码块。
     支持Python和Go语言的函数和变量定义查找。
     """
-    def __init__(self, projects_root: str):
+    def __init__(self, projects_root: str, index_root: Optional[str] = DB_STORAGE):
         """
         初始化ContextResolver。
         :param projects_root: 所有项目的根目录，用于定位项目。
+        :param index_root: 符号索引的缓存根目录（每个项目在 symbol_index/ 下一个子目录），为None时索引只保存在内存中。
         """
         self.projects_root = projects_root
-        logging.info(f"ContextResolver initialized with projects_root: {self.projects_root}")
+        self.index_root = index_root
+        # 项目路径 -> 符号索引的 Future；全局锁只保护字典本身，索引在锁外构建
+        self._symbol_indexes: Dict[str, Future] = {}
+        # 回退遍历得到的候选文件列表，按 (项目路径, 根目录mtime) 复用
+        self._walk_cache: Dict[str, Tuple[int, List[str]]] = {}
+        self._index_lock = threading.Lock()
+        # 已解析过的 (项目路径, 清洗后的名字) -> 结果，未找到定义（空列表）同样缓存
+        self._resolve_cache: Dict[Tuple[str, str], List[dict]] = {}
+        self._resolve_lock = threading.Lock()
+        # ripgrep 可用时由它完成目录遍历与匹配，否则退化为 Python 遍历
+        self.rg_path = shutil.which("rg")
+        logging.info(f"ContextResolver initialized with projects_root: {self.projects_root}, ripgrep: {self.rg_path or 'not found'}")
 
     def _read_file_content(self, file_path: str) -> Optional[str]:
         """
         安全地读取文件内容，处理文件大小限制并记录警告。
+        [新增] 解码后的内容按 (路径, mtime, 大小) 缓存，同一次审计中多次 resolve_context 不会重复读同一个文件。
         :param file_path: 要读取的文件路径。
         :return: 文件内容字符串，如果文件过大则截断，如果读取失败返回None。
         """
+        limit_bytes = int(FILE_SIZE_LIMIT_MB * 1024 * 1024) # FILE_SIZE_LIMIT_MB is a global constant
         try:
-            file_size_bytes = os.path.getsize(file_path)
-            file_size_mb = file_size_bytes / (1024 * 1024)
-
-            if file_size_mb > FILE_SIZE_LIMIT_MB: # FILE_SIZE_LIMIT_MB is a global constant
-                logging.warning(f"[WARNING] File too large: {file_path} ({file_size_mb:.2f}MB). Truncating to {FILE_SIZE_LIMIT_MB}MB.")
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    # Read up to FILE_SIZE_LIMIT_MB worth of characters
-                    content = f.read(int(FILE_SIZE_LIMIT_MB * 1024 * 1024))
-                return content + "\n[WARNING: File too large, truncated]\n"
+            st = os.stat(file_path)
+            cache_key = (file_path, st.st_mtime_ns, st.st_size)
+            content = _content_cache.get(cache_key)
+            if content is not None:
+                return content
+
+            # 一次 open+read 完成大小判断：多读1个字节即可知道文件是否超限，也不会整文件载入
+            with open(file_path, 'rb') as f:
+                data = f.read(limit_bytes + 1)
+            if len(data) > limit_bytes:
+                logging.warning(f"[WARNING] File too large: {file_path} (>{FILE_SIZE_LIMIT_MB}MB). Truncating to {FILE_SIZE_LIMIT_MB}MB.")
+                content = data[:limit_bytes].decode('utf-8', 'ignore') + "\n[WARNING: File too large, truncated]\n"
             else:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    return f.read()
-        except Exception as e:
+                content = data.decode('utf-8', 'ignore')
+            _content_cache.put(cache_key, content)
+            return content
+        except OSError as e: # 解码使用 errors='ignore'，不会抛出 UnicodeDecodeError
             logging.error(f"Error reading file {file_path}: {e}")
             return None
 
@@ -62,35 +249,33 @@ class ContextResolver:
     def _extract_python_definition(self, file_content: str, target_name: str) -> Optional[str]:
         """
         使用正则表达式从Python文件中提取函数或变量定义。
+        [修改] 合并后的正则按 target 缓存复用，一次全文搜索定位定义，只从定义所在行开始向后逐行扫描；
+        每行只做一次 lstrip，同时得到是否空行与缩进宽度。
         """
-        # 查找函数定义 (def function_name(...):)
-        func_pattern = re.compile(r'^(?:async\s+)?def\s+' + re.escape(target_name) + r'\s*\([^)]*\):', re.MULTILINE)
-        # 查找变量定义 (variable_name = ...)
-        var_pattern = re.compile(r'^\s*' + re.escape(target_name) + r'\s*=\s*(?:[^\n]*)$', re.MULTILINE)
+        match = _search_definition(_python_pattern(target_name), file_content, target_name)
+        if match is None:
+            return None
 
-        lines = file_content.splitlines()
-        definition_lines = []
-        in_definition = False
-        target_indent = -1
-
-        for i, line in enumerate(lines):
-            if func_pattern.search(line) or var_pattern.search(line):
-                definition_lines.append(line)
-                target_indent = len(line) - len(line.lstrip())
-                in_definition = True
-                continue
+        start = _line_start(file_content, match.start())
+        first_line_end = file_content.find('\n', start)
+        if first_line_end < 0:
+            return file_content[start:].strip()
+        first_line = file_content[start:first_line_end]
+        target_indent = len(first_line) - len(first_line.lstrip())
 
-            if in_definition:
-                current_indent = len(line) - len(line.lstrip())
-                if line.strip() == '' or current_indent > target_indent:
-                    definition_lines.append(line)
-                else:
-                    if line.strip() != '': 
-                        break
-                    else: 
-                        definition_lines.append(line) 
+        # 逐行向后查找第一个缩进不大于定义行的非空行，只切片定义本身，不对文件剩余部分做 splitlines
+        end = pos = first_line_end
+        while pos < len(file_content):
+            next_newline = file_content.find('\n', pos + 1)
+            if next_newline < 0:
+                next_newline = len(file_content)
+            line = file_content[pos + 1:next_newline]
+            stripped = line.lstrip()
+            if stripped and len(line) - len(stripped) <= target_indent:
+                break
+            end = pos = next_newline
 
-        return "\n".join(definition_lines).strip() if definition_lines else None
+        return file_content[start:end].strip()
 
     def _extract_go_definition(self, file_content: str, target_name: str) -> Optional[str]:
         """
@@ -100,118 +285,285 @@ class ContextResolver:
         2. 常量定义 (const X = ...)
         3. 变量定义 (var X = ...)
         4. 类型定义 (type X struct)
+        [修改] 合并后的正则按 target 缓存复用，一次全文搜索定位定义；
+        定义的结束位置由跳过字符串、rune 与注释的字符级扫描器确定，不会被字面量中的括号干扰。
         """
-        # 1. 查找函数定义: func Name( | func (r *Receiver) Name(
-        func_pattern = re.compile(r'^func\s+(?:\([^)]+\)\s+)?' + re.escape(target_name) + r'\s*\(', re.MULTILINE)
-        
-        # 2. 查找 常量/变量/类型 定义: const Name = | var Name = | type Name struct
-        # 使用 \b 确保 target_name 是完整单词，避免 minCompressBodyLength 匹配到 minCompressBodyLengthSuffix
-        def_pattern = re.compile(r'^\s*(?:const|var|type)\s+' + re.escape(target_name) + r'(?:\s|=|:|$)', re.MULTILINE)
+        match = _search_definition(_go_pattern(target_name), file_content, target_name)
+        if match is None:
+            return None
+
+        start = _line_start(file_content, match.start())
+        return file_content[start:_go_block_end(file_content, start)].strip()
+
+    @staticmethod
+    def _is_candidate_file(file_name: str) -> bool:
+        # 过滤非代码文件
+        if os.path.splitext(file_name)[1] not in SOURCE_EXTENSIONS:
+            return False
+        # 压缩/生成的代码不做扫描
+        if file_name.endswith(SKIP_FILE_SUFFIXES):
+            return False
+        # 忽略测试文件 (可选，根据需要开启或关闭)
+        if "_test.go" in file_name or "test_" in file_name:
+            return False
+        return True
+
+    def _walk_candidate_files(self, full_project_path: str):
+        """
+        纯 Python 遍历项目目录，逐个产出候选源文件路径（rg 不可用时的回退方案）。
+        基于 os.scandir 递归，目录判断直接使用 DirEntry 缓存的类型信息。
+        完整遍历过一次后，列表按根目录 mtime 缓存，之后的查询直接复用；提前命中而中断的遍历不缓存。
+        """
+        try:
+            root_mtime = os.stat(full_project_path).st_mtime_ns
+        except OSError:
+            return
+        cached = self._walk_cache.get(full_project_path)
+        if cached is not None and cached[0] == root_mtime:
+            yield from cached[1]
+            return
+
+        collected = []
+        stack = [full_project_path]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in PRUNE_DIRS and not entry.name.startswith('.'):
+                                    stack.append(entry.path)
+                            elif self._is_candidate_file(entry.name):
+                                collected.append(entry.path)
+                                yield entry.path
+                        except OSError:
+                            continue
+            except OSError as e:
+                logging.debug(f"Cannot scan directory {current}: {e}")
+        self._walk_cache[full_project_path] = (root_mtime, collected)
+
+    def _rg_candidate_files(self, full_project_path: str, clean_target_name: str) -> Optional[List[str]]:
+        """
+        使用 ripgrep 搜索疑似定义 target 的行，返回命中的文件列表（按首次命中顺序去重）。
+        :return: 文件路径列表；rg 不可用或执行出错时返回None，由调用方回退到 Python 遍历。
+        """
+        if not self.rg_path:
+            return None
+
+        name = re.escape(clean_target_name)
+        pattern = (r'^\s*(?:(?:async\s+)?def|func(?:\s*\([^)]*\))?|const|var|type)\s+' + name + r'\b'
+                   r'|^\s*' + name + r'\s*=')
+        command = [
+            self.rg_path, "--json", "-n", "--no-ignore", "--hidden",
+            "-g", "*.py", "-g", "*.go", *RG_EXCLUDE_GLOBS,
+            "-e", pattern, full_project_path
+        ]
+        try:
+            process = subprocess.run(command, capture_output=True, text=True, encoding='utf-8',
+                                     errors='ignore', timeout=RG_TIMEOUT_S)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.warning(f"ripgrep search failed ({e}). Falling back to Python directory walk.")
+            return None
+        # rg 退出码: 0 有匹配, 1 无匹配, 2 出错
+        if process.returncode not in (0, 1):
+            logging.warning(f"ripgrep exited with code {process.returncode}: {process.stderr.strip()[:200]}. Falling back to Python directory walk.")
+            return None
+
+        candidate_files = []
+        seen = set()
+        for line in process.stdout.splitlines():
+            try:
+                event = json_utils.loads(line)
+            except json_utils.JSONDecodeError:
+                continue
+            if event.get("type") != "match":
+                continue
+            file_path = event["data"]["path"].get("text")
+            if not file_path or file_path in seen:
+                continue
+            seen.add(file_path)
+            if self._is_candidate_file(os.path.basename(file_path)):
+                candidate_files.append(file_path)
+        return candidate_files
+
+    def _scan_file(self, file_path: str, target_name: str, clean_target_name: str) -> Optional[dict]:
+        """
+        读取单个文件并尝试提取 target 的定义。
+        先用 mmap 在原始字节上查找 target，不包含 target 的文件无需解码和正则匹配。
+        :return: 上下文字典，未找到返回None。
+        """
+        if not file_path.endswith(('.py', '.go')): # 其他语言暂不支持提取
+            return None
+        if not _file_contains(file_path, clean_target_name.encode('utf-8')):
+            return None
+
+        file_content = self._read_file_content(file_path)
+        if file_content is None:
+            return None
+
+        extracted_code = None
+        language = None
+
+        # 使用 clean_target_name 进行提取
+        if file_path.endswith('.py'):
+            language = 'Python'
+            extracted_code = self._extract_python_definition(file_content, clean_target_name)
+        elif file_path.endswith('.go'):
+            language = 'Go'
+            extracted_code = self._extract_go_definition(file_content, clean_target_name)
+        # 其他语言可扩展
+
+        if not extracted_code:
+            return None
+        logging.info(f"Found '{clean_target_name}' definition in {file_path} (Language: {language})")
+        return {
+            'target_name': target_name, # 保留原始请求的名字
+            'file_path': file_path,
+            'language': language,
+            'code_block': extracted_code
+        }
+
+    def _get_symbol_index(self, project_path: str) -> SymbolIndex:
+        """
+        获取项目的符号索引，同一进程内每个项目只加载/构建一次。
+        首个请求者在锁外构建索引，同一项目的其它线程等待其结果，其它项目的查询不受影响。
+        """
+        with self._index_lock:
+            future = self._symbol_indexes.get(project_path)
+            is_builder = future is None
+            if is_builder:
+                future = Future()
+                self._symbol_indexes[project_path] = future
+        if is_builder:
+            full_project_path = os.path.join(self.projects_root, project_path)
+            cache_dir = None
+            if self.index_root:
+                # 以完整相对路径的哈希区分目录，不同父目录下的同名项目不会互相覆盖索引
+                normalized = os.path.normpath(project_path)
+                path_digest = hashlib.blake2b(normalized.encode('utf-8', 'surrogateescape'), digest_size=8).hexdigest()
+                cache_dir = os.path.join(self.index_root, "symbol_index", f"{os.path.basename(normalized)}-{path_digest}")
+            try:
+                future.set_result(SymbolIndex(full_project_path, cache_dir))
+            except BaseException as e:
+                # 构建失败时移除占位，下次查询重新构建
+                with self._index_lock:
+                    if self._symbol_indexes.get(project_path) is future:
+                        del self._symbol_indexes[project_path]
+                future.set_exception(e)
+                raise
+        return future.result()
+
+    def _resolve_from_index(self, project_path: str, target_name: str, clean_target_name: str) -> Optional[dict]:
+        """
+        通过符号索引定位定义，只读取命中的那一个文件。
+        :return: 上下文字典；索引未命中或索引已与文件内容不一致时返回None。
+        """
+        entry = self._get_symbol_index(project_path).lookup(clean_target_name)
+        if entry is None:
+            return None
+        file_path, start_line, end_line = entry
+        file_content = self._read_file_content(file_path)
+        if file_content is None:
+            return None
 
         lines = file_content.splitlines()
-        definition_lines = []
-        brace_count = 0
-        in_definition = False
-
-        for line in lines:
-            # --- 尚未找到定义，进行搜索 ---
-            if not in_definition:
-                is_func = func_pattern.search(line)
-                is_def = def_pattern.search(line)
-
-                if is_func or is_def:
-                    in_definition = True
-                    definition_lines.append(line)
-                    
-                    # 统计大括号，决定是否是块结构
-                    if '{' in line:
-                        brace_count += line.count('{')
-                        brace_count -= line.count('}')
-                    
-                    # [关键逻辑] 处理单行定义
-                    # 如果是 const/var/type 定义，且当前行没有 '{' 也没有 '(' (忽略 var() 块的情况，简化处理)
-                    # 那么它通常是单行定义，如: const X = 1
-                    if is_def and not '{' in line and not '(' in line:
-                        break # 单行定义，直接结束
-                    
-                    continue
-
-            # --- 已找到定义，提取后续代码 ---
-            if in_definition:
-                definition_lines.append(line)
-                brace_count += line.count('{')
-                brace_count -= line.count('}')
-
-                if brace_count <= 0:
-                    # 对于函数或结构体，brace_count 归零且曾经有过 brace 表示结束
-                    if '{' in "".join(definition_lines): 
-                        break
-                    # 对于某些特殊情况（如无大括号的），brace_count 始终为0
-                    elif brace_count == 0 and not '{' in line:
-                        break
-                        
-        return "\n".join(definition_lines).strip() if definition_lines else None
+        if start_line >= len(lines):
+            return None
+        if end_line is not None:
+            extracted_code = textwrap.dedent("\n".join(lines[start_line:end_line + 1])).strip()
+        elif file_path.endswith('.go'):
+            extracted_code = self._extract_go_definition("\n".join(lines[start_line:]), clean_target_name)
+        else:
+            extracted_code = self._extract_python_definition("\n".join(lines[start_line:]), clean_target_name)
+        # 文件在建索引后被改动时，行号可能已失效
+        if not extracted_code or clean_target_name not in extracted_code:
+            return None
+
+        language = 'Python' if file_path.endswith('.py') else 'Go'
+        logging.info(f"Found '{clean_target_name}' definition in {file_path} via symbol index (Language: {language})")
+        return {
+            'target_name': target_name, # 保留原始请求的名字
+            'file_path': file_path,
+            'language': language,
+            'code_block': extracted_code
+        }
 
     def resolve_context(self, project_path: str, target_name: str) -> List[dict]:
         """
         在项目中搜索上下文。
         [修改] 在搜索前先清洗 target_name (例如去掉 g. 前缀)
+        [新增] 同一项目内重复查询同一个名字时直接返回缓存结果，项目结束后调用 clear_project_cache 释放。
         """
-        found_contexts = []
         full_project_path = os.path.join(self.projects_root, project_path)
         
         # === 1. 关键修改：清洗函数名 ===
         clean_target_name = self._clean_function_name(target_name)
+        cache_key = (project_path, clean_target_name)
+        with self._resolve_lock:
+            cached = self._resolve_cache.get(cache_key)
+        if cached is not None:
+            logging.info(f"Reusing resolved context for '{clean_target_name}' (raw: '{target_name}') in project: {full_project_path}")
+            return [dict(context, target_name=target_name) for context in cached]
+
+        found_contexts = self._search_context(project_path, full_project_path, target_name, clean_target_name)
+        with self._resolve_lock:
+            self._resolve_cache[cache_key] = found_contexts
+        return [dict(context) for context in found_contexts]
+
+    def _search_context(self, project_path: str, full_project_path: str, target_name: str, clean_target_name: str) -> List[dict]:
+        """
+        实际执行一次上下文搜索：先查符号索引，未命中再全文搜索。
+        """
+        found_contexts = []
         logging.info(f"Searching for cleaned '{clean_target_name}' (raw: '{target_name}') in project: {full_project_path}")
 
-        for root, dirs, files in os.walk(full_project_path):
-            # 过滤 .git 目录
-            if '.git' in dirs:
-                dirs.remove('.git')
-            if 'vendor' in dirs: # Go 项目通常忽略 vendor
-                dirs.remove('vendor')
-            
-            for file_name in files:
-                file_path = os.path.join(root, file_name)
-                
-                # 过滤非代码文件
-                if not file_name.endswith(('.go', '.py', '.js', '.java', '.cpp', '.c')):
-                    continue
-                
-                # 忽略测试文件 (可选，根据需要开启或关闭)
-                if "_test.go" in file_name or "test_" in file_name:
-                    continue
-
-                file_content = self._read_file_content(file_path)
-                if file_content is None:
-                    continue
-
-                extracted_code = None
-                language = None
-
-                # 使用 clean_target_name 进行提取
-                if file_name.endswith('.py'):
-                    language = 'Python'
-                    extracted_code = self._extract_python_definition(file_content, clean_target_name)
-                elif file_name.endswith('.go'):
-                    language = 'Go'
-                    extracted_code = self._extract_go_definition(file_content, clean_target_name)
-                # 其他语言可扩展
-
-                if extracted_code:
-                    logging.info(f"Found '{clean_target_name}' definition in {file_path} (Language: {language})")
-                    found_contexts.append({
-                        'target_name': target_name, # 保留原始请求的名字
-                        'file_path': file_path,
-                        'language': language,
-                        'code_block': extracted_code
-                    })
-                    
-                    # 找到一个定义就返回，节省资源
-                    if len(found_contexts) >= 1:
+        if SYMBOL_INDEX_ENABLED:
+            context = self._resolve_from_index(project_path, target_name, clean_target_name)
+            if context:
+                return [context]
+
+        # 索引未命中（例如函数体内的局部赋值）时回退到全文搜索
+        candidate_files = self._rg_candidate_files(full_project_path, clean_target_name)
+        if candidate_files is None:
+            candidate_files = self._walk_candidate_files(full_project_path)
+
+        # 读文件与正则匹配的耗时大多在 I/O 上，用线程池并发扫描，首个命中即取消其余任务。
+        # 在途任务数有上限，候选文件按需从遍历生成器中拉取，命中后目录遍历也随之停止。
+        max_inflight = CONTEXT_SCAN_WORKERS * 4
+        files = iter(candidate_files)
+        pending = set()
+        executor = ThreadPoolExecutor(max_workers=CONTEXT_SCAN_WORKERS)
+        try:
+            while True:
+                for file_path in itertools.islice(files, max_inflight - len(pending)):
+                    pending.add(executor.submit(self._scan_file, file_path, target_name, clean_target_name))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    context = future.result()
+                    if context:
+                        found_contexts.append(context)
+                        # 找到一个定义就返回，节省资源
                         return found_contexts
-        
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
         if not found_contexts:
             logging.info(f"No definition for '{clean_target_name}' found in project: {full_project_path}")
 
-        return found_contexts
\ No newline at end of file
+        return found_contexts
+
+    def clear_project_cache(self, project_path: str) -> None:
+        """
+        释放某个项目的解析结果缓存、符号索引与遍历缓存（项目审计结束后调用）。
+        """
+        with self._resolve_lock:
+            for key in [key for key in self._resolve_cache if key[0] == project_path]:
+                del self._resolve_cache[key]
+        with self._index_lock:
+            self._symbol_indexes.pop(project_path, None)
+        self._walk_cache.pop(os.path.join(self.projects_root, project_path), None)
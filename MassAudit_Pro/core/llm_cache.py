@@ -0,0 +1,105 @@
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict
+
+# 从配置中导入常量
+from MassAudit_Pro.config import LLM_CACHE_PATH, LLM_CACHE_TTL_S, LLM_CACHE_MEMORY_ITEMS
+from MassAudit_Pro.utils import json_utils
+
+class LLMCache:
+    """
+    LLM 响应的两级缓存：进程内 LRU + 磁盘 SQLite。
+    以 sha256(model|messages|response_format|max_tokens) 为键，命中时无需任何网络请求，
+    磁盘层可跨多次运行复用（例如同一 SARIF 结果被重复分析）。
+    """
+    def __init__(self, db_path: str = LLM_CACHE_PATH, ttl_s: int = LLM_CACHE_TTL_S, memory_items: int = LLM_CACHE_MEMORY_ITEMS):
+        """
+        初始化LLMCache。
+        :param db_path: 磁盘缓存的 SQLite 文件路径，为空时仅使用内存层。
+        :param ttl_s: 缓存条目的有效期（秒）。
+        :param memory_items: 内存层最多保留的条目数。
+        """
+        self.ttl_s = ttl_s
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._conn.execute('''CREATE TABLE IF NOT EXISTS llm_cache
+                                      (key TEXT PRIMARY KEY,
+                                       response TEXT,
+                                       expires_at REAL)''')
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Failed to open LLM disk cache at {db_path}: {e}. Falling back to memory only.")
+                self._conn = None
+        logging.info(f"LLMCache initialized. Disk: {db_path if self._conn else 'disabled'}, TTL: {ttl_s}s")
+
+    @staticmethod
+    def get_key(messages: List[Dict[str, str]], model: str, max_tokens: int = 0, response_format: Optional[dict] = None) -> str:
+        """
+        计算请求的缓存键。messages 以规范化 JSON 序列化，保证相同请求得到相同的键。
+        """
+        payload = json_utils.dumps(
+            {"model": model, "messages": messages, "response_format": response_format, "max_tokens": max_tokens},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存，先查内存层，未命中再查磁盘层并回填内存层。
+        :return: 缓存的响应内容，未命中或已过期返回None。
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return response
+                del self._memory[key]
+
+            if self._conn is None:
+                return None
+            try:
+                row = self._conn.execute("SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logging.error(f"LLM disk cache read failed: {e}")
+                return None
+            if row is None or row[1] <= now:
+                return None
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        """
+        写入缓存（带 TTL），同时写内存层与磁盘层。
+        """
+        expires_at = time.time() + self.ttl_s
+        with self._lock:
+            self._remember(key, response, expires_at)
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute("INSERT OR REPLACE INTO llm_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                                   (key, response, expires_at))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logging.error(f"LLM disk cache write failed: {e}")
+
+    def _remember(self, key: str, response: str, expires_at: float) -> None:
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
@@ -0,0 +1,77 @@
+
+import re
+import threading
+from typing import Optional, List, Dict
+
+# 从配置中导入常量
+from MassAudit_Pro.config import DEFAULT_MODEL, COMPLEX_MODEL, COMPLEX_TOKEN_THRESHOLD, MODEL_PRICES
+from MassAudit_Pro.core.prompt_compressor import count_tokens
+
+# 调用方可通过 task_type 显式声明任务复杂度：常规研判 (triage) 走对话模型，
+# 追问轮次用尽后的最终研判 (deep_triage) 走推理模型
+SIMPLE_TASK_TYPES = frozenset({"classify", "judge", "code_fix", "triage"})
+COMPLEX_TASK_TYPES = frozenset({"deep_triage", "exploit_chain"})
+_COMPLEX_KEYWORDS_RE = re.compile(r'exploit chain|taint|污点|利用链|数据流追踪', re.I)
+
+def select_model_by_complexity(messages: List[Dict[str, str]], task_type: Optional[str] = None) -> str:
+    """
+    根据任务复杂度选择模型：简单分类/判定走便宜的 DEFAULT_MODEL，复杂研判走推理模型 COMPLEX_MODEL。
+    :param messages: 聊天消息列表
+    :param task_type: 调用方声明的任务类型，未声明时按 token 数与关键词启发式判断
+    :return: 模型名称
+    """
+    if task_type in COMPLEX_TASK_TYPES:
+        return COMPLEX_MODEL
+    if task_type in SIMPLE_TASK_TYPES:
+        return DEFAULT_MODEL
+
+    text = "\n".join(m.get("content") or "" for m in messages)
+    if _COMPLEX_KEYWORDS_RE.search(text) or count_tokens(text) >= COMPLEX_TOKEN_THRESHOLD:
+        return COMPLEX_MODEL
+    return DEFAULT_MODEL
+
+class CostAnalyzer:
+    """
+    按模型累计 token 用量并根据价目表（美元 / 百万 token）估算花费。
+    """
+    def __init__(self, prices: Dict[str, Dict[str, float]] = MODEL_PRICES):
+        """
+        初始化CostAnalyzer。
+        :param prices: {model: {"input": 单价, "output": 单价}}
+        """
+        self.prices = prices
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            usage = self._usage.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            usage["calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens or 0
+            usage["completion_tokens"] += completion_tokens or 0
+
+    def cost(self, model: Optional[str] = None) -> float:
+        """
+        估算花费（美元）。model 为None时返回所有模型的合计。
+        """
+        with self._lock:
+            models = [model] if model else list(self._usage)
+            total = 0.0
+            for name in models:
+                usage = self._usage.get(name)
+                price = self.prices.get(name)
+                if not usage or not price:
+                    continue
+                total += usage["prompt_tokens"] / 1e6 * price.get("input", 0.0)
+                total += usage["completion_tokens"] / 1e6 * price.get("output", 0.0)
+            return total
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        返回每个模型的调用次数、token 用量与估算花费。
+        """
+        with self._lock:
+            models = {name: dict(usage) for name, usage in self._usage.items()}
+        for name, usage in models.items():
+            usage["cost_usd"] = round(self.cost(name), 4)
+        return models
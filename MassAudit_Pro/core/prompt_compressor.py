@@ -0,0 +1,131 @@
+
+import re
+import logging
+from typing import List, Dict
+
+# 从配置中导入常量
+from MassAudit_Pro.config import PROMPT_COMPRESS_LEVEL, MAX_INPUT_TOKENS
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception: # tiktoken 为可选依赖，缺失时退化为字符估算
+    _ENCODING = None
+
+# 以代码块为界切分文本，代码块内容保持原样（缩进对 Python/Go 语义至关重要）
+_FENCE_SPLIT_RE = re.compile(r'(```.*?```)', re.S)
+_INLINE_SPACE_RE = re.compile(r'[ \t]{2,}')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_PLEASANTRY_RE = re.compile(r'\b(?:please|kindly|could you|would you|thank you|thanks)\b[,!]?\s*|请你|麻烦你|谢谢[！!。]?', re.I)
+_TRIM_MARKER = "\n... [truncated by prompt compressor] ...\n"
+
+def count_tokens(text: str) -> int:
+    """
+    估算文本的 token 数。安装了 tiktoken 时精确计数，否则按 ASCII 4 字符/token、其它字符 1 字符/token 估算。
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+class PromptCompressor:
+    """
+    发送前压缩 Prompt，减少输入 token。
+    - lite: 折叠代码块以外的多余空白与空行。
+    - standard: 在 lite 基础上去除客套用语、删除跨消息重复的指令行。
+    - full: 在 standard 基础上去掉 Markdown 加粗标记和所有空行。
+    无论哪一级，超出 max_input_tokens 时都会优先截断最长代码块的中段，避免请求超出模型上下文。
+    """
+    LEVELS = ("off", "lite", "standard", "full")
+
+    def __init__(self, level: str = PROMPT_COMPRESS_LEVEL, max_input_tokens: int = MAX_INPUT_TOKENS):
+        """
+        初始化PromptCompressor。
+        :param level: 压缩级别，off / lite / standard / full。
+        :param max_input_tokens: 输入 token 预算，0 表示不限制。
+        """
+        if level not in self.LEVELS:
+            logging.warning(f"Unknown prompt compress level '{level}', falling back to 'standard'.")
+            level = "standard"
+        self.level = level
+        self.max_input_tokens = max_input_tokens
+
+    def _compress_prose(self, text: str, seen_lines: set) -> str:
+        """
+        压缩代码块以外的文字部分。
+        """
+        out_lines = []
+        for line in text.split("\n"):
+            line = _INLINE_SPACE_RE.sub(" ", line.strip())
+            if self.level in ("standard", "full") and line:
+                line = _PLEASANTRY_RE.sub("", line).strip()
+                if not line:
+                    continue
+                # 只对足够长的指令行去重，避免误删短小的标题或分隔符
+                if len(line) > 20:
+                    if line in seen_lines:
+                        continue
+                    seen_lines.add(line)
+            if self.level == "full":
+                line = line.replace("**", "")
+                if not line:
+                    continue
+            out_lines.append(line)
+        return _BLANK_LINES_RE.sub("\n\n", "\n".join(out_lines))
+
+    def _compress_text(self, text: str, seen_lines: set) -> str:
+        parts = _FENCE_SPLIT_RE.split(text)
+        # split 后奇数下标为代码块
+        return "".join(part if i % 2 else self._compress_prose(part, seen_lines) for i, part in enumerate(parts))
+
+    def _enforce_budget(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        超出 token 预算时，从最长的代码块开始截断中间部分（保留首尾），直到满足预算或无法再截断。
+        """
+        total = sum(count_tokens(m.get("content") or "") for m in messages)
+        while total > self.max_input_tokens:
+            # 找到所有消息中尚未截断过的最长代码块
+            best = None
+            for idx, msg in enumerate(messages):
+                for m in _FENCE_SPLIT_RE.finditer(msg.get("content") or ""):
+                    if _TRIM_MARKER in m.group(0):
+                        continue
+                    if best is None or (m.end() - m.start()) > best[2] - best[1]:
+                        best = (idx, m.start(), m.end())
+            if best is None:
+                break
+            idx, start, end = best
+            content = messages[idx]["content"]
+            block = content[start:end]
+            overflow_chars = max(len(block) // 4, (total - self.max_input_tokens) * 4)
+            keep = (len(block) - overflow_chars) // 2
+            if keep <= 16:
+                break
+            trimmed = block[:keep] + _TRIM_MARKER + block[-keep:]
+            messages[idx] = dict(messages[idx], content=content[:start] + trimmed + content[end:])
+            total = sum(count_tokens(m.get("content") or "") for m in messages)
+        return messages
+
+    def compress(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        返回压缩后的新消息列表，不修改调用方传入的对象。只压缩 system / user 消息。
+        """
+        if self.level == "off":
+            return messages
+
+        seen_lines: set = set()
+        compressed = []
+        for msg in messages:
+            content = msg.get("content")
+            if msg.get("role") in ("system", "user") and isinstance(content, str):
+                msg = dict(msg, content=self._compress_text(content, seen_lines))
+            compressed.append(msg)
+
+        if self.max_input_tokens:
+            compressed = self._enforce_budget(compressed)
+
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            before = sum(count_tokens(m.get("content") or "") for m in messages)
+            after = sum(count_tokens(m.get("content") or "") for m in compressed)
+            logging.debug(f"Prompt compressed ({self.level}): {before} -> {after} tokens")
+        return compressed
@@ -0,0 +1,43 @@
+
+import time
+import threading
+
+class TokenBucket:
+    """
+    令牌桶限速器：以 rate 个/秒的速度补充令牌，最多积攒 capacity 个，用于平滑请求速率、避免触发服务端 RPM 限制。
+    同一个实例可被多个线程共享：令牌的预约在锁内完成，等待在锁外进行。
+    """
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        初始化TokenBucket。
+        :param rate: 每秒补充的令牌数，<=0 表示不限速。
+        :param capacity: 桶容量，即允许的最大突发请求数。
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """
+        预约一个令牌，返回需要等待的秒数。令牌不足时允许余额为负，后续调用者依次顺延，保证先到先得。
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self) -> None:
+        """
+        阻塞直到获得一个令牌。
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,185 @@
+
+import os
+import re
+import ast
+import hashlib
+import logging
+from typing import Optional, List, Dict, Tuple
+
+from MassAudit_Pro.config import PRUNE_DIRS, SKIP_FILE_SUFFIXES
+from MassAudit_Pro.utils import json_utils
+
+try:
+    from tree_sitter_languages import get_parser as _ts_get_parser
+except ImportError: # tree-sitter 为可选依赖，缺失时 Go 退化为正则索引
+    _ts_get_parser = None
+
+# 索引条目：(文件路径, 起始行号, 结束行号)，行号从0开始且结束行包含在内；
+# 结束行号为None表示只记录了定义起点，由调用方按语言规则向后提取代码块
+SymbolEntry = Tuple[str, int, Optional[int]]
+
+INDEX_FILE_NAME = "symbols.json"
+INDEX_VERSION = 3
+_GO_DEF_RE = re.compile(r'^(?:func[ \t]+(?:\([^)]+\)[ \t]+)?(?P<func>\w+)[ \t]*\(|[ \t]*(?:const|var|type)[ \t]+(?P<def>\w+))', re.MULTILINE)
+
+def _iter_source_files(project_path: str):
+    """
+    递归产出项目中需要建立索引的 .py / .go 文件及其 DirEntry（跳过测试文件、生成文件与依赖目录）。
+    """
+    stack = [project_path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in PRUNE_DIRS and not entry.name.startswith('.'):
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and entry.name.endswith(('.py', '.go')):
+                    if "_test.go" in entry.name or "test_" in entry.name or entry.name.endswith(SKIP_FILE_SUFFIXES):
+                        continue
+                    yield entry
+            except OSError:
+                continue
+
+def _python_symbols(source: bytes, file_path: str) -> Dict[str, SymbolEntry]:
+    """
+    使用 ast 解析 Python 文件，收集模块级与类体内的函数、类、变量定义（含装饰器与多行签名）。
+    """
+    try:
+        tree = ast.parse(source, filename=file_path)
+    except (SyntaxError, ValueError) as e:
+        logging.debug(f"Skipping unparsable Python file {file_path}: {e}")
+        return {}
+
+    symbols: Dict[str, SymbolEntry] = {}
+    bodies = [tree.body]
+    while bodies:
+        for node in bodies.pop():
+            names = []
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names = [node.name]
+                if isinstance(node, ast.ClassDef):
+                    bodies.append(node.body)
+            elif isinstance(node, ast.Assign):
+                names = [t.id for t in node.targets if isinstance(t, ast.Name)]
+            elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+                names = [node.target.id]
+            if not names:
+                continue
+            start = min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])]) - 1
+            end = (node.end_lineno or node.lineno) - 1
+            for name in names:
+                symbols.setdefault(name, (file_path, start, end))
+    return symbols
+
+def _go_symbols(source: bytes, file_path: str) -> Dict[str, SymbolEntry]:
+    """
+    收集 Go 文件中的函数/方法与 const/var/type 定义。
+    安装了 tree_sitter_languages 时使用语法树得到精确范围，否则用正则只记录定义起点。
+    """
+    symbols: Dict[str, SymbolEntry] = {}
+    if _ts_get_parser is not None:
+        tree = _ts_get_parser('go').parse(source)
+        for node in tree.root_node.children:
+            if node.type in ('function_declaration', 'method_declaration'):
+                specs = [node]
+            elif node.type in ('type_declaration', 'const_declaration', 'var_declaration'):
+                specs = [c for c in node.children if c.type in ('type_spec', 'const_spec', 'var_spec')]
+            else:
+                continue
+            for spec in specs:
+                name_node = spec.child_by_field_name('name')
+                if name_node is None:
+                    continue
+                name = name_node.text.decode('utf-8', 'ignore')
+                # 单个 spec 取其自身范围，函数/方法取整个声明
+                symbols.setdefault(name, (file_path, spec.start_point[0], spec.end_point[0]))
+        return symbols
+
+    text = source.decode('utf-8', 'ignore')
+    for m in _GO_DEF_RE.finditer(text):
+        name = m.group('func') or m.group('def')
+        symbols.setdefault(name, (file_path, text.count('\n', 0, m.start()), None))
+    return symbols
+
+class SymbolIndex:
+    """
+    项目级符号索引：symbol_name -> (文件, 起止行)。
+    每个项目只解析一次源码，之后的 resolve_context 查询为一次字典查找；
+    索引以 JSON 持久化（不使用 pickle，缓存目录中的文件不会被当作代码执行），源码文件的 mtime 指纹变化时自动重建。
+    """
+    def __init__(self, project_path: str, cache_dir: Optional[str] = None):
+        """
+        初始化SymbolIndex并加载或构建索引。
+        :param project_path: 项目源代码的绝对路径。
+        :param cache_dir: 索引缓存目录，为None时不落盘。
+        """
+        self.project_path = project_path
+        self.cache_file = os.path.join(cache_dir, INDEX_FILE_NAME) if cache_dir else None
+        self.symbols: Dict[str, SymbolEntry] = {}
+
+        files = list(_iter_source_files(project_path))
+        fingerprint = self._fingerprint(files)
+        if not self._load(fingerprint):
+            self._build(files)
+            self._save(fingerprint)
+
+    def _fingerprint(self, files: List[os.DirEntry]) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{INDEX_VERSION}|{_ts_get_parser is not None}".encode())
+        for entry in files:
+            try:
+                digest.update(f"{entry.path}|{entry.stat().st_mtime_ns}\n".encode('utf-8', 'ignore'))
+            except OSError:
+                continue
+        return digest.hexdigest()
+
+    def _load(self, fingerprint: str) -> bool:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return False
+        try:
+            cached = json_utils.load_file(self.cache_file)
+            if cached.get("fingerprint") != fingerprint:
+                logging.info(f"Symbol index for {self.project_path} is stale. Rebuilding.")
+                return False
+            symbols = {name: (str(path), int(start), None if end is None else int(end))
+                       for name, (path, start, end) in cached["symbols"].items()}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logging.warning(f"Failed to load symbol index {self.cache_file}: {e}. Rebuilding.")
+            return False
+        self.symbols = symbols
+        logging.info(f"Loaded symbol index for {self.project_path}: {len(self.symbols)} symbols.")
+        return True
+
+    def _build(self, files: List[os.DirEntry]) -> None:
+        for entry in files:
+            try:
+                with open(entry.path, 'rb') as f:
+                    source = f.read()
+            except OSError as e:
+                logging.debug(f"Skipping unreadable file {entry.path}: {e}")
+                continue
+            parser = _python_symbols if entry.name.endswith('.py') else _go_symbols
+            for name, location in parser(source, entry.path).items():
+                self.symbols.setdefault(name, location)
+        logging.info(f"Built symbol index for {self.project_path}: {len(self.symbols)} symbols from {len(files)} files.")
+
+    def _save(self, fingerprint: str) -> None:
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(json_utils.dumps({"fingerprint": fingerprint, "symbols": self.symbols}))
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logging.warning(f"Failed to save symbol index {self.cache_file}: {e}")
+
+    def lookup(self, name: str) -> Optional[SymbolEntry]:
+        return self.symbols.get(name)
@@ -1,28 +1,38 @@
-import json
 import logging
 import re
 from typing import Dict, Any, List, Optional
 
 # Import constants and classes from other modules
-from MassAudit_Pro.config import MAX_CONTEXT_RETRIES, MAX_CALLS_PER_PROJECT, PROJECT_API_CALL_COUNTS
+from MassAudit_Pro.config import MAX_CONTEXT_RETRIES
 from MassAudit_Pro.core.api_caller import APICaller
 from MassAudit_Pro.core.context_resolver import ContextResolver
+from MassAudit_Pro.core.call_budget import CallBudget, BudgetExceeded
+from MassAudit_Pro.utils import json_utils
+
+# Markdown 代码围栏（```go、```python、``` 等），一次替换全部去除
+_CODE_FENCE_RE = re.compile(r'```[A-Za-z0-9_+-]*\n?')
+
+def strip_code_fences(text: str) -> str:
+    """
+    去掉 AI 返回代码中的 Markdown 代码围栏及首尾空白。
+    """
+    return _CODE_FENCE_RE.sub('', text).strip()
 
 class VulnerabilityAnalyzer:
     """
     管理Agentic Context Loop，包括初始请求、AI响应解析、上下文检索和递归增强Prompt，
     并实现上下文递归熔断。
     """
-    def __init__(self, api_caller: APICaller, context_resolver: ContextResolver, project_api_call_counts: Dict[str, int]):
+    def __init__(self, api_caller: APICaller, context_resolver: ContextResolver, call_budget: CallBudget):
         """
         初始化VulnerabilityAnalyzer。
         :param api_caller: APICaller实例，用于与DeepSeek API交互。
         :param context_resolver: ContextResolver实例，用于查找代码上下文。
-        :param project_api_call_counts: 存储每个项目API调用次数的字典。
+        :param call_budget: 项目级API调用额度（计数由 APICaller 在每次实际请求后累加）。
         """
         self.api_caller = api_caller
         self.context_resolver = context_resolver
-        self.project_api_call_counts = project_api_call_counts
+        self.call_budget = call_budget
         logging.info("VulnerabilityAnalyzer initialized with APICaller, ContextResolver, and project API call tracking.")
 
     def _build_initial_prompt(self, initial_code_snippet: str, project_name: str = "", file_path: str = "", line_number: int = 0) -> List[Dict[str, str]]:
@@ -97,18 +107,18 @@ class VulnerabilityAnalyzer:
         [新增] 健壮的 JSON 解析器，能处理 Markdown 包裹、截断等问题。
         """
         try:
-            return json.loads(raw_response)
-        except json.JSONDecodeError:
+            return json_utils.loads(raw_response)
+        except json_utils.JSONDecodeError:
             pass
         
         # 1. 尝试提取 ```json ... ``` 内容
         try:
             if "```json" in raw_response:
                 content = raw_response.split("```json")[1].split("```")[0].strip()
-                return json.loads(content)
+                return json_utils.loads(content)
             elif "```" in raw_response: # 可能是 ``` ... ```
                 content = raw_response.split("```")[1].split("```")[0].strip()
-                return json.loads(content)
+                return json_utils.loads(content)
         except:
             pass
 
@@ -118,7 +128,7 @@ class VulnerabilityAnalyzer:
             end = raw_response.rfind("}")
             if start != -1 and end != -1:
                 json_str = raw_response[start:end+1]
-                return json.loads(json_str)
+                return json_utils.loads(json_str)
         except:
             pass
 
@@ -134,11 +144,11 @@ class VulnerabilityAnalyzer:
             else:
                  # 暴力补全
                  repaired = raw_response + '"}' 
-                 return json.loads(repaired)
+                 return json_utils.loads(repaired)
         except:
             pass
 
-        raise json.JSONDecodeError("Failed to parse JSON even after cleanup", raw_response, 0)
+        raise json_utils.JSONDecodeError("Failed to parse JSON even after cleanup", raw_response, 0)
 
     def analyze_vulnerability(
         self,
@@ -159,30 +169,25 @@ class VulnerabilityAnalyzer:
 
         logging.info(f"[INFO] 🕵️ Project {project_name}: Starting analysis for snippet at {file_path}:{line_number}")
 
-        # Initialize project call count if not present
-        if project_name not in self.project_api_call_counts:
-            self.project_api_call_counts[project_name] = 0
-
         for retry_count in range(MAX_CONTEXT_RETRIES + 1): # +1 to include the initial request
             current_round_log = {"round": retry_count, "request": current_messages[-1]['content']}
 
             # --- Project-level API call limit check ---
-            if self.project_api_call_counts[project_name] >= MAX_CALLS_PER_PROJECT:
-                logging.warning(f"[WARN] ❌ Project {project_name}: Hit API limit ({self.project_api_call_counts[project_name]}/{MAX_CALLS_PER_PROJECT}), stopping analysis for this vulnerability.")
+            if self.call_budget.exhausted(project_name):
+                logging.warning(f"[WARN] ❌ Project {project_name}: Hit API limit ({self.call_budget.count(project_name)}/{self.call_budget.limit}), stopping analysis for this vulnerability.")
                 final_result = {"status": "skipped", "verdict": "SKIPPED_QUOTA_LIMIT", "reason": "Project API call limit exceeded."}
                 analysis_log.append(current_round_log) # Log the attempt before hitting limit
                 break
 
-            if APICaller._circuit_breaker_tripped: # Check global circuit breaker
-                logging.critical(f"[ERROR] Global API circuit breaker tripped. Terminating analysis for {project_name}.")
-                final_result = {"status": "aborted", "verdict": "unknown", "reason": "Global API circuit breaker tripped."}
+            if APICaller.circuit_open(): # Check global circuit breaker
+                logging.critical(f"[ERROR] Global API circuit breaker open. Terminating analysis for {project_name}.")
+                final_result = {"status": "aborted", "verdict": "unknown", "reason": "Global API circuit breaker open."}
                 analysis_log.append(current_round_log) # Log the attempt before global trip
                 break
 
             try:
-                logging.info(f"[INFO] 🕵️ Project {project_name}: Sending request to AI (Round {retry_count + 1}/{MAX_CONTEXT_RETRIES + 1}) - API Calls for Project: {self.project_api_call_counts[project_name]}/{MAX_CALLS_PER_PROJECT}")
-                raw_response = self.api_caller.call_llm(messages=current_messages)
-                self.project_api_call_counts[project_name] += 1 # Increment call count after successful API call
+                logging.info(f"[INFO] 🕵️ Project {project_name}: Sending request to AI (Round {retry_count + 1}/{MAX_CONTEXT_RETRIES + 1}) - API Calls for Project: {self.call_budget.count(project_name)}/{self.call_budget.limit}")
+                raw_response = self.api_caller.call_llm(messages=current_messages, task_type="triage", project_name=project_name)
                 
                 current_round_log["raw_response"] = raw_response
                 
@@ -224,11 +229,15 @@ class VulnerabilityAnalyzer:
                     final_result = {"status": "final", "verdict": "medium", "reason": f"AI returned unknown status '{status}'. Concluding with existing info."}
                     break
 
-            except json.JSONDecodeError as e:
+            except json_utils.JSONDecodeError as e:
                 logging.error(f"[ERROR] Project {project_name}: AI response was not valid JSON: {raw_response[:200]}... Error: {e}. Forcing conclusion.")
                 # 这里可以做一个更优雅的降级，例如认为分析失败但继续流程
                 final_result = {"status": "final", "verdict": "medium", "reason": f"AI returned malformed JSON (truncated or invalid). Error: {e}. Concluding with existing info."}
                 break
+            except BudgetExceeded as e:
+                logging.warning(f"[WARN] ❌ {e} Stopping analysis for this vulnerability.")
+                final_result = {"status": "skipped", "verdict": "SKIPPED_QUOTA_LIMIT", "reason": "Project API call limit exceeded."}
+                break
             except RuntimeError as e: # Catch circuit breaker trip from APICaller
                 logging.error(f"[ERROR] Project {project_name}: API call failed due to {e}. Forcing conclusion.")
                 final_result = {"status": "aborted", "verdict": "unknown", "reason": f"API call failed due to {e}."}
@@ -249,12 +258,14 @@ class VulnerabilityAnalyzer:
                 last_chance_messages.append({"role": "user", "content": "此为最后一次请求，请务必根据已有信息给出最终漏洞判断（包含 is_testable 和 poc_code 字段）。"})
 
             try:
-                raw_response = self.api_caller.call_llm(messages=last_chance_messages)
-                self.project_api_call_counts[project_name] += 1 
+                raw_response = self.api_caller.call_llm(messages=last_chance_messages, task_type="deep_triage", project_name=project_name)
                 # [修改] 使用 _safe_parse_json
                 ai_response = self._safe_parse_json(raw_response)
                 final_result = ai_response 
                 logging.info(f"[INFO] Project {project_name}: AI provided final conclusion after context limit: {ai_response.get('verdict')}")
+            except BudgetExceeded as e:
+                logging.warning(f"[WARN] ❌ {e} Skipping final attempt.")
+                final_result = {"status": "skipped", "verdict": "SKIPPED_QUOTA_LIMIT", "reason": "Project API call limit exceeded."}
             except Exception as e:
                 logging.error(f"[ERROR] Project {project_name}: Error during final attempt: {e}.")
                 final_result = {"status": "final", "verdict": "medium", "reason": "Error during final attempt. Concluding with existing info."}
@@ -297,17 +308,16 @@ class VulnerabilityAnalyzer:
 
         try:
             logging.info(f"[Auto-Fix] 🔧 Asking AI to fix code based on compiler errors...")
-            raw_response = self.api_caller.call_llm(messages=messages)
+            raw_response = self.api_caller.call_llm(messages=messages, task_type="code_fix")
             
             # [修改] 使用 _safe_parse_json
             try:
                 data = self._safe_parse_json(raw_response)
                 clean_code = data.get("fixed_code", "")
-                clean_code = clean_code.replace("```go", "").replace("```", "").strip()
-                return clean_code
+                return strip_code_fences(clean_code)
             except Exception:
                 # 最后的兜底
-                return raw_response.replace("```go", "").replace("```", "").strip()
+                return strip_code_fences(raw_response)
 
         except Exception as e:
             logging.error(f"[Auto-Fix] Failed to fix code: {e}")
@@ -12,30 +12,36 @@ def cleanup_project_artifacts(project_relative_path: str) -> None:
     :param project_relative_path: 项目相对于 PROJECTS_ROOT 的路径。
     """
     full_project_path = os.path.join(PROJECTS_ROOT, project_relative_path)
-    if not os.path.isdir(full_project_path):
+    lock_file_name = ".scan.lock"
+    temp_dir_name = "temp_scan_data"
+
+    # 一次读取项目根目录即可同时判断锁文件与临时目录是否存在，项目不存在时也在这里发现
+    try:
+        with os.scandir(full_project_path) as it:
+            artifacts = [entry for entry in it if entry.name in (lock_file_name, temp_dir_name)]
+    except (FileNotFoundError, NotADirectoryError):
         logging.warning(f"Cleanup skipped: Project path does not exist or is not a directory: {full_project_path}")
         return
+    except OSError as e:
+        logging.warning(f"Cleanup skipped: Cannot read project directory {full_project_path}: {e}")
+        return
 
     logging.info(f"Starting cleanup for project artifacts in: {full_project_path}")
 
-    # 1. 查找并删除锁文件
-    lock_file_name = ".scan.lock"
-    lock_file_path = os.path.join(full_project_path, lock_file_name)
-    if os.path.exists(lock_file_path):
-        try:
-            os.remove(lock_file_path)
-            logging.info(f"Successfully removed lock file: {lock_file_path}")
-        except OSError as e:
-            logging.error(f"Failed to remove lock file {lock_file_path}: {e}")
+    for entry in artifacts:
+        # 1. 删除锁文件
+        if entry.name == lock_file_name and not entry.is_dir():
+            try:
+                os.remove(entry.path)
+                logging.info(f"Successfully removed lock file: {entry.path}")
+            except OSError as e:
+                logging.error(f"Failed to remove lock file {entry.path}: {e}")
+        # 2. 删除临时目录
+        elif entry.name == temp_dir_name and entry.is_dir():
+            try:
+                shutil.rmtree(entry.path)
+                logging.info(f"Successfully removed temporary directory: {entry.path}")
+            except OSError as e:
+                logging.error(f"Failed to remove temporary directory {entry.path}: {e}")
 
-    # 2. 查找并删除临时目录
-    temp_dir_name = "temp_scan_data"
-    temp_dir_path = os.path.join(full_project_path, temp_dir_name)
-    if os.path.isdir(temp_dir_path):
-        try:
-            shutil.rmtree(temp_dir_path)
-            logging.info(f"Successfully removed temporary directory: {temp_dir_path}")
-        except OSError as e:
-            logging.error(f"Failed to remove temporary directory {temp_dir_path}: {e}")
-    
     logging.info(f"Cleanup completed for project artifacts in: {full_project_path}")
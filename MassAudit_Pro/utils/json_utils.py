@@ -0,0 +1,42 @@
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError: # orjson 为可选依赖，缺失时退化为标准库 json
+    orjson = None
+
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，调用方统一捕获该异常即可
+JSONDecodeError = json.JSONDecodeError
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    解析 JSON 文本，优先使用 orjson。
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj: Any, sort_keys: bool = False, indent: bool = False) -> str:
+    """
+    序列化为 JSON 字符串（非 ASCII 字符原样输出、紧凑分隔符），优先使用 orjson。
+    :param sort_keys: 是否按键排序，用于生成规范化的序列化结果（如缓存键）。
+    :param indent: 是否以2空格缩进输出。
+    """
+    if orjson is not None:
+        option = (orjson.OPT_SORT_KEYS if sort_keys else 0) | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, option=option).decode('utf-8')
+        except TypeError: # orjson 不支持的类型（如 Decimal、超过64位的整数）交给标准库处理
+            pass
+    if indent:
+        return json.dumps(obj, sort_keys=sort_keys, ensure_ascii=False, indent=2)
+    return json.dumps(obj, sort_keys=sort_keys, ensure_ascii=False, separators=(',', ':'))
+
+def load_file(path: str) -> Any:
+    """
+    读取并解析 JSON 文件。
+    """
+    with open(path, 'rb') as f:
+        return loads(f.read())
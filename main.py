@@ -1,53 +1,215 @@
 import os
+import re
+import argparse
+import itertools
 import logging
+import shutil
 import sqlite3
-import json
 import time
+import asyncio
+import atexit
+import threading
+import signal
 import subprocess # Used for executing shell commands
-import random     # Used for generating random filenames
 from datetime import datetime
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from typing import Dict, Any, List
 
 # Import all necessary modules and constants
-from MassAudit_Pro.config import API_KEY, API_BASE, PROJECTS_ROOT, DB_STORAGE, PROJECT_API_CALL_COUNTS, MAX_CALLS_PER_PROJECT
+from MassAudit_Pro.config import get_settings, setup_logging, API_KEY, API_BASE, PROJECTS_ROOT, DB_STORAGE, C2_FLUSH_EVERY, SARIF_CACHE_ENABLED, CODEQL_CONCURRENCY, PROJECT_AUDIT_CONCURRENCY, FINDING_ANALYSIS_CONCURRENCY, POC_VERIFY_CONCURRENCY, SNIPPET_FILE_CACHE_SIZE, SNIPPET_CACHE_MAX_FILE_MB, POC_OUTPUT_TAIL_LINES, POC_OUTPUT_LINE_MAX_CHARS
 from MassAudit_Pro.core.api_caller import APICaller
+from MassAudit_Pro.core.llm_cache import LLMCache
+from MassAudit_Pro.core.prompt_compressor import PromptCompressor
+from MassAudit_Pro.core.call_budget import CallBudget
 from MassAudit_Pro.core.context_resolver import ContextResolver
 from MassAudit_Pro.core.codeql_manager import CodeQLManager
-from MassAudit_Pro.core.vulnerability_analyzer import VulnerabilityAnalyzer
+from MassAudit_Pro.core.vulnerability_analyzer import VulnerabilityAnalyzer, strip_code_fences
 from MassAudit_Pro.utils.cleanup_utils import cleanup_project_artifacts
+from MassAudit_Pro.utils import json_utils
 from MassAudit_Pro.reporting.reporter import Reporter
 
+# 不参与研判的告警路径：Go 测试文件、Python 测试文件（test_ 开头）与 vendor 目录，均按路径分隔符对齐，
+# 避免 latest_version.go、myvendor/ 之类的误判
+SKIP_RESULT_PATH_RE = re.compile(r'_test\.go$|(?:^|/)test_[^/]*$|(?:^|/)vendor/')
+
+# go test 输出中每次运行都会变化的部分：用例/包耗时 (0.01s)、\t0.005s，以及 panic 栈中的指针与偏移地址
+_VOLATILE_OUTPUT_RE = re.compile(r'(?<=\()\d+\.\d+s(?=\))|(?<=\t)\d+\.\d+s$|0x[0-9a-fA-F]{2,}', re.MULTILINE)
+
+def _mask_volatile(match: re.Match) -> str:
+    return "0x?" if match.group().startswith("0x") else "?s"
+
+# AI 响应中的 JSON 对象（贪婪匹配，从第一个 '{' 到最后一个 '}'）
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.S)
+
+# PoC 输出中表示编译/环境错误的关键字，合并为一个正则单遍扫描
+COMPILE_ERROR_MARKERS = (
+    "build failed", "undefined:", "imported and not used",
+    "no required module", "cannot find package", "setup failed"
+)
+COMPILE_ERROR_RE = re.compile("|".join(map(re.escape, COMPILE_ERROR_MARKERS)))
+# PoC 编译失败后让 AI 自动修复的最大次数
+POC_MAX_FIX_ATTEMPTS = 8
+
+def _compile_error_signature(output: str) -> str:
+    """
+    提取 PoC 输出中包含编译/环境错误关键字的行，作为本次失败的特征。
+    """
+    return "\n".join(line for line in output.splitlines() if COMPILE_ERROR_RE.search(line))
+
+# AI Judge Prompt 的固定部分，只在模块加载时拼接一次；每次调用只插入控制台输出
+# [关键修改] 使用字符串拼接来构建 Prompt，防止被输出过滤器截断
+_JUDGE_PROMPT_HEAD = (
+    "You are a Security Audit Result Analyst.\n"
+    "I ran a Go language PoC (Proof of Concept exploit), and below is the console output.\nPlease analyze this output and determine the vulnerability status.\n"
+)
+_JUDGE_PROMPT_TAIL = """
+        【Judgment Criteria】
+        1. **VULN_CRASH**: A `panic:` occurred and the process crashed (not caught by recover), or a `segmentation fault` occurred. This is High Risk.
+        2. **VULN_RECOVERED**: A panic occurred but was caught by `recover()` (script often logs "Panic captured" or similar). This indicates Robustness Issue or DoS risk.
+        3. **SAFE_PASS**: Test output `PASS`, and no panic or error messages appeared. Code successfully defended.
+        4. **TEST_FAIL**: Test output `FAIL` (assertion error), but no panic. PoC logic failed to trigger expected behavior.
+        5. **ERROR**: Compilation failed, missing packages, or setup failed. Script didn't run properly.
+        """ + """
+        【Output Format】
+        You must return a valid JSON object:
+        {
+            "status": "VULN_CRASH" | "VULN_RECOVERED" | "SAFE_PASS" | "TEST_FAIL" | "ERROR",
+            "reason": "One sentence explaining why."
+        }
+        """
+
+# Icon mapping based on AI verdict
+VERIFY_STATUS_ICONS = {
+    "VULN_CRASH": "🚨",
+    "VULN_RECOVERED": "⚠️",
+    "SAFE_PASS": "✅",
+    "TEST_FAIL": "➖",
+    "ERROR": "❌"
+}
+
+# C2 数据库连接在进程内常驻，WAL 模式下写入不阻塞读取，synchronous=NORMAL 减少 fsync
+C2_DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+)
+# 漏洞入库语句，所有项目共用同一字符串，sqlite3 的语句缓存只需编译一次
+C2_INSERT_VULN_SQL = ("INSERT INTO vulnerabilities (project_name, vuln_type, severity, file_path, line_number, code_snippet, ai_verdict, verification_result) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+# 语言 -> CodeQL 查询包
+QUERY_PACK_MAP = {
+    'python': 'codeql/python-queries',
+    'go': 'codeql/go-queries',
+    'java': 'codeql/java-queries',
+    'javascript': 'codeql/javascript-queries',
+    'csharp': 'codeql/csharp-queries',
+    'cpp': 'codeql/cpp-queries'
+}
+
+def _write_text_file(path: str, text: str) -> None:
+    """
+    以 UTF-8 覆盖写入文本文件（PoC 脚本），直接使用 os.open/os.write，绕过 TextIOWrapper 的编码与缓冲层。
+    """
+    data = text.encode('utf-8')
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _drain(stream, tail: deque) -> None:
+    """
+    逐行读取子进程输出流直到 EOF，只保留末尾若干行（每行截断到 POC_OUTPUT_LINE_MAX_CHARS）。
+    """
+    with stream:
+        for line in stream:
+            tail.append(line[:POC_OUTPUT_LINE_MAX_CHARS])
+
+def _run_capped(cmd: List[str], cwd: str, timeout: float) -> str:
+    """
+    运行 PoC 验证命令并返回 stdout 与 stderr 的末尾部分。
+    两个读取线程边运行边排空管道，内存中只保留各自最后 POC_OUTPUT_TAIL_LINES 行，
+    输出再多也不会整份读入内存。
+    命令在独立的进程组中运行，超时时终止整个进程组：go test 编译出的测试二进制及其子进程一并结束，
+    不会残留进程或继续占用管道。
+    :raises subprocess.TimeoutExpired: 超时（子进程已被终止）。
+    """
+    process = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, errors='replace', start_new_session=True)
+    stdout_tail = deque(maxlen=POC_OUTPUT_TAIL_LINES)
+    stderr_tail = deque(maxlen=POC_OUTPUT_TAIL_LINES)
+    drains = [threading.Thread(target=_drain, args=(process.stdout, stdout_tail), daemon=True),
+              threading.Thread(target=_drain, args=(process.stderr, stderr_tail), daemon=True)]
+    for t in drains:
+        t.start()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+        raise
+    finally:
+        for t in drains:
+            t.join()
+    return "".join(stdout_tail) + "\n" + "".join(stderr_tail)
+
 class AuditSystem:
     """
     MassAudit Pro: Intelligent Interactive Code Audit System Main Coordinator.
     """
-    def __init__(self, rescan_mode: bool = False):
+    def __init__(self, rescan_mode: bool = False, shard_index: int = 0, num_shards: int = 1):
         """
         Initialize the audit system.
+        :param shard_index: 当前进程负责的分片编号（0 起）。
+        :param num_shards: 分片总数，项目按名称排序后轮流分配给各分片，便于多进程/多机器并行审计。
         """
         self.rescan_mode = rescan_mode
+        self.shard_index = shard_index
+        self.num_shards = num_shards
         self.reporter = Reporter()
-        self.api_caller = APICaller(API_KEY, API_BASE)
+        self.call_budget = CallBudget()
+        self.api_caller = APICaller(API_KEY, API_BASE, cache=LLMCache(), compressor=PromptCompressor(), budget=self.call_budget)
         self.context_resolver = ContextResolver(PROJECTS_ROOT)
         self.codeql_manager = CodeQLManager(DB_STORAGE, PROJECTS_ROOT)
-        self.vulnerability_analyzer = VulnerabilityAnalyzer(self.api_caller, self.context_resolver, PROJECT_API_CALL_COUNTS)
+        self.vulnerability_analyzer = VulnerabilityAnalyzer(self.api_caller, self.context_resolver, self.call_budget)
         
         self.reports_dir = os.path.join(os.getcwd(), "reports")
-        if not os.path.exists(self.reports_dir):
-            os.makedirs(self.reports_dir)
+        os.makedirs(self.reports_dir, exist_ok=True)
             
+        # 待写入 SQLite 的高危漏洞：project_name -> 行列表
+        self._pending_vulns: Dict[str, List[tuple]] = {}
+        self._pending_vulns_lock = threading.Lock()
+        # 报告目录的文件名前缀集合，由 _build_report_index 在每次 run_audit 开始时构建
+        self._report_index = None
         self._init_c2_database()
 
         mode_str = "RESCAN (Create new timestamps)" if self.rescan_mode else "RESUME (Skip existing)"
         logging.info(f"AuditSystem initialized. Mode: {mode_str}")
 
     def _init_c2_database(self):
-        """Initialize local database for C2 utilization."""
+        """
+        Initialize local database for C2 utilization.
+        [修改] 建立一个常驻连接（WAL + 调优后的 pragma），后续写入都复用它，进程退出时关闭。
+        """
+        self._db_conn = None
+        self._db_lock = threading.Lock()
         try:
-            conn = sqlite3.connect('my_arsenal.db')
-            c = conn.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS vulnerabilities
-                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            # isolation_level=None：由 _flush_vulns 显式控制事务；连接会在多个审计线程间共享，写入由 _db_lock 串行化
+            conn = sqlite3.connect('my_arsenal.db', isolation_level=None, check_same_thread=False)
+            for pragma in C2_DB_PRAGMAS:
+                conn.execute(pragma)
+            # id 使用普通 INTEGER PRIMARY KEY（rowid 别名），不带 AUTOINCREMENT，插入时无需维护 sqlite_sequence
+            conn.execute('''CREATE TABLE IF NOT EXISTS vulnerabilities
+                         (id INTEGER PRIMARY KEY,
                           project_name TEXT,
                           vuln_type TEXT,
                           severity TEXT,
@@ -57,143 +219,206 @@ class AuditSystem:
                           ai_verdict TEXT,
                           verification_result TEXT,
                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-            conn.commit()
-            conn.close()
+            # 已完成审计的项目，续扫时与报告目录一起用于判断项目是否需要跳过
+            conn.execute('''CREATE TABLE IF NOT EXISTS scanned_projects
+                         (project_name TEXT PRIMARY KEY,
+                          finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+            self._db_conn = conn
+            atexit.register(conn.close)
         except Exception as e:
             logging.error(f"Failed to init C2 database: {e}")
 
     def _save_to_sqlite(self, project_name, vuln_data):
-        """Save high-risk vulnerabilities to SQLite."""
+        """
+        Queue high-risk vulnerabilities for SQLite.
+        [修改] 先在内存中暂存，每 C2_FLUSH_EVERY 条及项目结束时由 _flush_vulns 在一个事务内批量写入，避免每条漏洞一次 commit/fsync。
+        """
         if vuln_data.get('verdict', '').upper() not in ['HIGH', 'MEDIUM']:
-            return 
-            
+            return
+
+        row = (project_name,
+               vuln_data.get('original_rule_id'),
+               vuln_data.get('verdict'),
+               vuln_data.get('file_path'),
+               vuln_data.get('line_number'),
+               vuln_data.get('code_snippet', '')[:500],
+               vuln_data.get('reason', ''),
+               vuln_data.get('verify_output', 'Not Verified'))
+        # 多个项目在不同线程中并发审计，按项目分别暂存
+        with self._pending_vulns_lock:
+            rows = self._pending_vulns.setdefault(project_name, [])
+            rows.append(row)
+            should_flush = len(rows) >= C2_FLUSH_EVERY
+        # 每攒够 C2_FLUSH_EVERY 条就落库一次，项目中途中断时已研判的结果不会全部丢失
+        if should_flush:
+            self._flush_vulns(project_name)
+
+    def _flush_vulns(self, project_name):
+        """
+        将某个项目暂存的漏洞一次性写入 SQLite。
+        """
+        with self._pending_vulns_lock:
+            rows = self._pending_vulns.pop(project_name, [])
+        if not rows:
+            return
+
+        if self._db_conn is None:
+            logging.error(f"DB Error: C2 database unavailable, dropping {len(rows)} vulnerabilities of {project_name}")
+            return
+
         try:
-            conn = sqlite3.connect('my_arsenal.db')
-            c = conn.cursor()
-            c.execute("INSERT INTO vulnerabilities (project_name, vuln_type, severity, file_path, line_number, code_snippet, ai_verdict, verification_result) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                      (project_name, 
-                       vuln_data.get('original_rule_id'), 
-                       vuln_data.get('verdict'),
-                       vuln_data.get('file_path'), 
-                       vuln_data.get('line_number'),
-                       vuln_data.get('code_snippet', '')[:500], 
-                       vuln_data.get('reason', ''),
-                       vuln_data.get('verify_output', 'Not Verified'))) 
-            conn.commit()
-            conn.close()
-            print(f"💾 [C2] Vulnerability stored: {vuln_data.get('original_rule_id')}")
+            with self._db_lock:
+                self._db_conn.execute("BEGIN")
+                try:
+                    self._db_conn.executemany(C2_INSERT_VULN_SQL, rows)
+                    self._db_conn.execute("COMMIT")
+                except Exception:
+                    self._db_conn.execute("ROLLBACK")
+                    raise
+            self.reporter.log_info(f"💾 [C2] {len(rows)} vulnerabilities stored for {project_name}")
         except Exception as e:
             logging.error(f"DB Error: {e}")
 
-    def _save_project_report(self, project_name, vulnerabilities):
+    def _save_project_report(self, project_name, vulnerabilities, partial: bool = False):
         """
         Generate report containing verification results.
+        :param partial: 项目未审计完整（有告警因 API 故障中止）时为True，报告写入 reports_dir/partial，
+                        不会被 _build_report_index 视为已扫描；partial 报告在两种模式下都命名为 {project}_report.md，
+                        重复中止只会覆盖同一份，项目完整审计后将其删除。
         """
-        if self.rescan_mode:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{project_name}_{timestamp}.md"
+        partial_dir = os.path.join(self.reports_dir, "partial")
+        partial_path = os.path.join(partial_dir, f"{project_name}_report.md")
+        if partial:
+            os.makedirs(partial_dir, exist_ok=True)
+            report_path = partial_path
         else:
-            filename = f"{project_name}_report.md"
+            if self.rescan_mode:
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                filename = f"{project_name}_{timestamp}.md"
+            else:
+                filename = f"{project_name}_report.md"
+            report_path = os.path.join(self.reports_dir, filename)
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+
+        parts = [
+            f"# {project_name} Audit Report\n"
+            f"**Generated At**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"**Mode**: {'Rescan' if self.rescan_mode else 'Resume'}\n"
+            f"**Vulnerabilities Found**: {len(vulnerabilities)}\n\n"
+        ]
+        # 每条漏洞拼成一个字符串，最后一次性写入文件
+        for idx, v in enumerate(vulnerabilities):
+            parts.append(
+                f"## {idx+1}. {v.get('original_rule_id', 'Unknown Issue')}\n"
+                f"- **File**: `{v.get('file_path')}` : `{v.get('line_number')}`\n"
+                f"- **AI Verdict**: **{v.get('verdict')}**\n"
+                f"- **Analysis**: {v.get('reason')}\n"
+            )
+
+            # === [Modified] Automated Verification Results (AI Judge Based) ===
+            if v.get('has_poc'):
+                verify_status = v.get('verify_status', 'UNKNOWN')
+                verify_output = v.get('verify_output', '').strip()
+                ai_judge_reason = v.get('ai_judge_reason', 'No reasoning provided.')
+                icon = VERIFY_STATUS_ICONS.get(verify_status, "❓")
+                parts.append(
+                    f"\n> 🛡️ **Automated Verification Report (Auto-Verify)**\n"
+                    f"> **PoC Script**: `{v.get('poc_path')}`\n"
+                    f"> **Status**: {icon} **{verify_status}**\n"
+                    f"> **AI Judgment**: {ai_judge_reason}\n"
+                    f"> **Console Output Snippet**: \n```text\n{verify_output[:1000]}...\n```\n"
+                )
+            elif v.get('verdict', '').upper() in ['HIGH', 'MEDIUM']:
+                parts.append(f"\n> ⚠️ **Verification**: AI determined untestable or skipped.\n")
+
+            parts.append("---\n")
 
-        report_path = os.path.join(self.reports_dir, filename)
-        
         try:
-            with open(report_path, "w", encoding="utf-8") as f:
-                f.write(f"# {project_name} Audit Report\n")
-                f.write(f"**Generated At**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"**Mode**: {'Rescan' if self.rescan_mode else 'Resume'}\n")
-                f.write(f"**Vulnerabilities Found**: {len(vulnerabilities)}\n\n")
-                
-                for idx, v in enumerate(vulnerabilities):
-                    f.write(f"## {idx+1}. {v.get('original_rule_id', 'Unknown Issue')}\n")
-                    f.write(f"- **File**: `{v.get('file_path')}` : `{v.get('line_number')}`\n")
-                    f.write(f"- **AI Verdict**: **{v.get('verdict')}**\n")
-                    f.write(f"- **Analysis**: {v.get('reason')}\n")
-                    
-                    # === [Modified] Automated Verification Results (AI Judge Based) ===
-                    if v.get('has_poc'):
-                        f.write(f"\n> 🛡️ **Automated Verification Report (Auto-Verify)**\n")
-                        f.write(f"> **PoC Script**: `{v.get('poc_path')}`\n")
-                        
-                        verify_status = v.get('verify_status', 'UNKNOWN')
-                        verify_output = v.get('verify_output', '').strip()
-                        ai_judge_reason = v.get('ai_judge_reason', 'No reasoning provided.')
-                        
-                        # Icon mapping based on AI verdict
-                        icon_map = {
-                            "VULN_CRASH": "🚨", 
-                            "VULN_RECOVERED": "⚠️", 
-                            "SAFE_PASS": "✅", 
-                            "TEST_FAIL": "➖", 
-                            "ERROR": "❌"
-                        }
-                        icon = icon_map.get(verify_status, "❓")
-                        
-                        f.write(f"> **Status**: {icon} **{verify_status}**\n")
-                        f.write(f"> **AI Judgment**: {ai_judge_reason}\n")
-                        f.write(f"> **Console Output Snippet**: \n```text\n{verify_output[:1000]}...\n```\n")
-                    
-                    elif v.get('verdict', '').upper() in ['HIGH', 'MEDIUM']:
-                         f.write(f"\n> ⚠️ **Verification**: AI determined untestable or skipped.\n")
-                         
-                    f.write("---\n")
-            self.reporter.log_info(f"✅ Report saved: {filename}")
+            # 整份报告编码后以二进制一次写出：超过缓冲区的单次写入由 BufferedWriter 直接下发，不经过文本层与 8KB 分块
+            with open(report_path, "wb") as f:
+                f.write("".join(parts).encode("utf-8"))
+            self.reporter.log_info(f"✅ Report saved: {os.path.relpath(report_path, self.reports_dir)}")
         except Exception as e:
             self.reporter.log_error(f"Failed to save report for {project_name}: {e}")
 
+    def _mark_project_scanned(self, project_name: str):
+        """
+        在 scanned_projects 表中记录项目已完成审计。
+        """
+        if self._db_conn is None:
+            return
+        try:
+            with self._db_lock:
+                self._db_conn.execute("INSERT OR REPLACE INTO scanned_projects (project_name, finished_at) VALUES (?, CURRENT_TIMESTAMP)", (project_name,))
+        except sqlite3.Error as e:
+            logging.error(f"Failed to record scan state for {project_name}: {e}")
+
+    def _build_report_index(self):
+        """
+        一次 scandir 读取报告目录，收集每个 .md 报告文件名中所有 '_' 之前的前缀。
+        报告文件名形如 {project}_report.md 或 {project}_{timestamp}.md，项目名本身也可能含 '_'，
+        因此记录全部候选前缀，之后判断项目是否已扫描只需一次集合查找。
+        [新增] 同时并入 scanned_projects 表中记录的项目（一次 SELECT），报告被移走后也不会重复审计。
+        """
+        prefixes = set()
+        if self._db_conn is not None:
+            try:
+                with self._db_lock:
+                    prefixes.update(row[0] for row in self._db_conn.execute("SELECT project_name FROM scanned_projects"))
+            except sqlite3.Error as e:
+                logging.warning(f"Cannot read scan state from C2 database: {e}")
+        try:
+            with os.scandir(self.reports_dir) as it:
+                for entry in it:
+                    name = entry.name
+                    if not name.endswith(".md"):
+                        continue
+                    idx = name.find("_")
+                    while idx > 0:
+                        prefixes.add(name[:idx])
+                        idx = name.find("_", idx + 1)
+        except OSError as e:
+            logging.warning(f"Cannot read reports directory {self.reports_dir}: {e}")
+        self._report_index = prefixes
+
     def _check_if_project_scanned(self, project_name):
-        """Check if report exists."""
-        std_report = os.path.join(self.reports_dir, f"{project_name}_report.md")
-        if os.path.exists(std_report) and os.path.getsize(std_report) > 50:
-            return True
-        for f in os.listdir(self.reports_dir):
-            if f.startswith(f"{project_name}_") and f.endswith(".md"):
-                return True
-        return False
+        """
+        Check if report exists.
+        [修改] 任何以 {project_name}_ 开头的 .md 报告（包括标准报告 {project_name}_report.md）都视为已扫描，
+        基于 _build_report_index 建立的前缀集合判断，不再为每个项目重新 listdir。
+        """
+        if self._report_index is None:
+            self._build_report_index()
+        return project_name in self._report_index
 
     def _analyze_poc_output_with_ai(self, console_output: str) -> Dict[str, str]:
         """
         [New] AI Judge: Analyze PoC console output to determine if vulnerability is confirmed.
         """
-        # [关键修改] 使用字符串拼接来构建 Prompt，防止被输出过滤器截断
-        p_role = "You are a Security Audit Result Analyst.\n"
-        p_task = "I ran a Go language PoC (Proof of Concept exploit), and below is the console output.\nPlease analyze this output and determine the vulnerability status.\n"
-        p_content = f"\n【Console Output】\n```text\n{console_output[-2000:]} \n```\n(Showing last 2000 characters)\n"
-        
-        p_criteria = """
-        【Judgment Criteria】
-        1. **VULN_CRASH**: A `panic:` occurred and the process crashed (not caught by recover), or a `segmentation fault` occurred. This is High Risk.
-        2. **VULN_RECOVERED**: A panic occurred but was caught by `recover()` (script often logs "Panic captured" or similar). This indicates Robustness Issue or DoS risk.
-        3. **SAFE_PASS**: Test output `PASS`, and no panic or error messages appeared. Code successfully defended.
-        4. **TEST_FAIL**: Test output `FAIL` (assertion error), but no panic. PoC logic failed to trigger expected behavior.
-        5. **ERROR**: Compilation failed, missing packages, or setup failed. Script didn't run properly.
-        """
-        p_format = """
-        【Output Format】
-        You must return a valid JSON object:
-        {
-            "status": "VULN_CRASH" | "VULN_RECOVERED" | "SAFE_PASS" | "TEST_FAIL" | "ERROR",
-            "reason": "One sentence explaining why."
-        }
-        """
-        # 拼接 Prompt
-        final_prompt = p_role + p_task + p_content + p_criteria + p_format
-        
+        # 去掉每次运行都会变化的耗时与内存地址，使相同结果的 Prompt 完全一致，从而命中 LLM 响应缓存；
+        # 先截取末尾再替换，只处理真正进入 Prompt 的部分
+        console_output = _VOLATILE_OUTPUT_RE.sub(_mask_volatile, console_output[-2000:])
+        final_prompt = f"{_JUDGE_PROMPT_HEAD}\n【Console Output】\n```text\n{console_output} \n```\n(Showing last 2000 characters)\n{_JUDGE_PROMPT_TAIL}"
+
         messages = [{"role": "user", "content": final_prompt}]
         try:
             # Reuse api_caller
-            response = self.api_caller.call_llm(messages=messages)
+            response = self.api_caller.call_llm(messages=messages, task_type="judge")
             
             # Robust JSON parsing
             try:
-                return json.loads(response)
-            except:
-                # If raw text contains JSON code block, try to extract it
-                if "```json" in response:
-                    clean = response.split("```json")[1].split("```")[0].strip()
-                    return json.loads(clean)
-                elif "{" in response:
-                    return json.loads(response[response.find("{"):response.rfind("}")+1])
+                return json_utils.loads(response)
+            except json_utils.JSONDecodeError:
+                # 响应外面包了 ```json 围栏或说明文字时，取第一个 '{' 到最后一个 '}' 之间的内容再解析
+                match = _JSON_OBJECT_RE.search(response)
+                if match:
+                    try:
+                        return json_utils.loads(match.group())
+                    except json_utils.JSONDecodeError:
+                        pass
                 return {"status": "UNKNOWN", "reason": "Failed to parse AI JSON response."}
                 
         except Exception as e:
@@ -203,10 +428,16 @@ class AuditSystem:
     def run_audit(self):
         """Execute audit flow."""
         available_projects = []
-        if os.path.isdir(PROJECTS_ROOT):
-            for item in os.listdir(PROJECTS_ROOT):
-                if os.path.isdir(os.path.join(PROJECTS_ROOT, item)):
-                    available_projects.append(item)
+        # scandir 的 DirEntry 自带目录项类型，不必对每个项目再 stat 一次
+        try:
+            with os.scandir(PROJECTS_ROOT) as it:
+                available_projects = [entry.name for entry in it if entry.is_dir()]
+        except OSError as e:
+            logging.error(f"Cannot list projects in {PROJECTS_ROOT}: {e}")
+
+        if self.num_shards > 1:
+            available_projects = [name for i, name in enumerate(sorted(available_projects)) if i % self.num_shards == self.shard_index]
+            self.reporter.log_info(f"Shard {self.shard_index + 1}/{self.num_shards}: {len(available_projects)} projects assigned.")
 
         if not available_projects:
             self.reporter.log_warning(f"No projects found in {PROJECTS_ROOT}.")
@@ -214,205 +445,402 @@ class AuditSystem:
 
         self.reporter.log_info(f"Found {len(available_projects)} projects. Mode: {'RESCAN ALL' if self.rescan_mode else 'RESUME UNFINISHED'}")
 
+        pending_projects = []
+        if not self.rescan_mode:
+            self._build_report_index()
         for i, project_name in enumerate(available_projects):
-            project_relative_path = project_name 
-            
             if not self.rescan_mode:
                 if self._check_if_project_scanned(project_name):
                     self.reporter.log_info(f"⏩ [Skip] {project_name} ({i+1}/{len(available_projects)}): Report exists.")
                     continue
+            pending_projects.append((i, project_name))
 
-            self.reporter.log_info(f"\n🚀 [{i+1}/{len(available_projects)}] Auditing: {project_name}")
+        asyncio.run(self._run_projects(pending_projects, len(available_projects)))
 
-            current_time_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-            poc_base_dir = os.path.join(os.getcwd(), "poc_scripts", f"{project_name}_{current_time_str}")
+        for model, usage in self.api_caller.cost_analyzer.summary().items():
+            self.reporter.log_info(f"💰 {model}: {usage['calls']} calls, {usage['prompt_tokens']} in / {usage['completion_tokens']} out tokens, ~${usage['cost_usd']}")
+        self.reporter.log_info("MassAudit Pro: Process completed.")
 
-            if APICaller._circuit_breaker_tripped:
-                break
+    async def _run_projects(self, pending_projects: List[tuple], total: int):
+        """
+        多项目流水线：CodeQL 建库与扫描阶段按 CODEQL_CONCURRENCY 并发，
+        AI 研判阶段在工作线程中执行，最多 PROJECT_AUDIT_CONCURRENCY 个项目同时进行。
+        熔断器、调用额度、缓存均为线程安全且在进程内共享，因此使用线程而不是进程池。
+        """
+        codeql_slots = asyncio.Semaphore(CODEQL_CONCURRENCY)
+        audit_slots = asyncio.Semaphore(PROJECT_AUDIT_CONCURRENCY)
+
+        async def run_one(i: int, project_name: str):
+            async with codeql_slots:
+                prepared = await self._prepare_project(project_name, i, total)
+            if prepared is None:
+                return
+            async with audit_slots:
+                return await asyncio.to_thread(self._audit_project, project_name, *prepared)
+
+        results = await asyncio.gather(*(run_one(i, name) for i, name in pending_projects), return_exceptions=True)
+        total_findings = 0
+        for (_, project_name), result in zip(pending_projects, results):
+            if isinstance(result, Exception):
+                self.reporter.log_error(f"Project {project_name} aborted: {result}")
+            elif result:
+                total_findings += len(result)
+        self.reporter.log_info(f"📊 Analyzed {total_findings} findings across {len(pending_projects)} projects.")
+
+    async def _prepare_project(self, project_name: str, i: int, total: int):
+        """
+        CodeQL 阶段：清理残留、识别语言、建库并扫描。
+        :return: (db_path, SARIF 文件路径)，任一步骤失败返回None；复用缓存的 SARIF 时 db_path 为None。
+        """
+        project_relative_path = project_name
+        self.reporter.log_info(f"\n🚀 [{i+1}/{total}] Auditing: {project_name}")
+
+        cleanup_project_artifacts(project_relative_path)
+
+        detected_language = await asyncio.to_thread(self.codeql_manager._detect_language, project_relative_path)
+        if not detected_language:
+            self.reporter.log_warning(f"Skipping {project_name}: Language not detected.")
+            return None
+
+        codeql_query_pack = QUERY_PACK_MAP.get(detected_language.lower())
+
+        # 源码树、语言、查询包与 CodeQL 版本都未变化时直接复用上次的 SARIF，跳过建库与扫描；
+        # Rescan 模式强制重新扫描（不读取缓存），扫描结果仍写入缓存供之后的 Resume 使用
+        sarif_cache_key = None
+        if SARIF_CACHE_ENABLED:
+            sarif_cache_key = await asyncio.to_thread(self.codeql_manager.sarif_cache_key, project_relative_path, detected_language, codeql_query_pack)
+            cached_sarif_path = None
+            if sarif_cache_key and not self.rescan_mode:
+                cached_sarif_path = self.codeql_manager.get_cached_sarif(project_name, sarif_cache_key)
+            if cached_sarif_path:
+                self.reporter.log_info(f"♻️ Source unchanged, reusing cached CodeQL results for {project_name}")
+                return None, cached_sarif_path
+        
+        db_path = await self.codeql_manager.create_database(project_name, project_relative_path, detected_language)
+        if not db_path: return None
 
-            cleanup_project_artifacts(project_relative_path)
+        sarif_output_path = os.path.join(db_path, f"{project_name}-results.sarif")
+        generated_sarif_path = await self.codeql_manager.run_analysis(db_path, codeql_query_pack, sarif_output_path)
+        
+        if not generated_sarif_path:
+            self.codeql_manager.cleanup_database(db_path)
+            return None
 
-            detected_language = self.codeql_manager._detect_language(project_relative_path)
-            if not detected_language:
-                self.reporter.log_warning(f"Skipping {project_name}: Language not detected.")
-                continue
+        if sarif_cache_key:
+            await asyncio.to_thread(self.codeql_manager.store_sarif, project_name, sarif_cache_key, generated_sarif_path)
+        return db_path, generated_sarif_path
 
-            query_pack_map = {
-                'python': 'codeql/python-queries',
-                'go': 'codeql/go-queries', 
-                'java': 'codeql/java-queries',
-                'javascript': 'codeql/javascript-queries',
-                'csharp': 'codeql/csharp-queries',
-                'cpp': 'codeql/cpp-queries'
-            }
-            codeql_query_pack = query_pack_map.get(detected_language.lower())
-            
-            db_path = self.codeql_manager.create_database(project_name, project_relative_path, detected_language)
-            if not db_path: continue
+    @staticmethod
+    def _read_code_snippet(file_lines_cache: "OrderedDict[str, List[str]]", cache_lock: threading.Lock, full_file_path: str, start_line: int) -> str:
+        """
+        截取告警行前后约20行作为代码片段。
+        超过 SNIPPET_CACHE_MAX_FILE_MB 的大文件不缓存，只用 islice 流式读到窗口末尾，不把整份文件载入内存。
+        :param file_lines_cache: 文件路径 -> 行列表的 LRU 缓存，由调用方在单个项目内复用。
+        :param cache_lock: 保护 file_lines_cache 的锁（研判线程会并发读取代码片段），文件读取本身在锁外进行。
+        :return: 代码片段，文件不存在或读取失败时返回空字符串。
+        """
+        start_idx = max(0, start_line - 21)
+        with cache_lock:
+            lines = file_lines_cache.get(full_file_path)
+            if lines is not None:
+                file_lines_cache.move_to_end(full_file_path)
+        if lines is None:
+            try:
+                with open(full_file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    if os.fstat(f.fileno()).st_size > SNIPPET_CACHE_MAX_FILE_MB * 1024 * 1024:
+                        return "".join(itertools.islice(f, start_idx, start_line + 20))
+                    lines = f.readlines()
+            except OSError:
+                return ""
+            with cache_lock:
+                file_lines_cache[full_file_path] = lines
+                if len(file_lines_cache) > SNIPPET_FILE_CACHE_SIZE:
+                    file_lines_cache.popitem(last=False)
+        return "".join(lines[start_idx:start_line + 20])
+
+    def _iter_audit_targets(self, sarif_path: str):
+        """
+        流式读取 SARIF 并逐条产出需要研判的 (rule_id, file_uri, start_line)（跳过测试文件与 vendor 目录）。
+        每条 result 的位置信息只解析一次；同一规则在同一位置的重复告警（不同查询路径报出）只产出一次。
+        SARIF 在读取中途被发现损坏时记录错误并结束迭代，已产出的结果照常处理。
+        """
+        seen = set()
+        try:
+            for result in self.codeql_manager.iter_sarif_results(sarif_path):
+                locations = result.get('locations')
+                location = (locations[0].get('physicalLocation') if locations else None) or {}
+                artifact = location.get('artifactLocation')
+                file_uri = artifact.get('uri', 'unknown_file') if artifact else 'unknown_file'
+                if SKIP_RESULT_PATH_RE.search(file_uri):
+                    continue
+                region = location.get('region')
+                target = (result.get('ruleId', 'unknown'), file_uri, region.get('startLine', 0) if region else 0)
+                if target in seen:
+                    continue
+                seen.add(target)
+                yield target
+        except ValueError as e: # json.JSONDecodeError / ijson.JSONError 均转换为 ValueError
+            self.reporter.log_error(f"SARIF file '{sarif_path}' is corrupted or has invalid JSON format: {e}. Remaining results skipped.")
 
-            sarif_output_path = os.path.join(db_path, f"{project_name}-results.sarif")
-            generated_sarif_path = self.codeql_manager.run_analysis(db_path, codeql_query_pack, sarif_output_path)
-            
-            if not generated_sarif_path:
-                self.codeql_manager.cleanup_database(db_path)
-                continue
-
-            sarif_results = self.codeql_manager.parse_sarif_results(generated_sarif_path)
-            if not sarif_results:
-                self.codeql_manager.cleanup_database(db_path)
-                continue
-            
-            project_vulnerabilities = []
-            
-            raw_results = []
-            if sarif_results.get('runs'):
-                for run in sarif_results['runs']:
-                    for result in run.get('results', []):
-                        location = result.get('locations', [{}])[0].get('physicalLocation', {})
-                        file_uri = location.get('artifactLocation', {}).get('uri', 'unknown_file')
-                        if "_test.go" in file_uri or "test_" in file_uri or "vendor/" in file_uri:
-                            continue 
-                        raw_results.append(result)
-
-            self.reporter.log_info(f"🔍 Found {len(raw_results)} issues in {project_name}")
-            full_project_source_path = os.path.join(PROJECTS_ROOT, project_relative_path)
-
-            for result in raw_results:
-                rule_id = result.get('ruleId', 'unknown')
-                location = result.get('locations', [{}])[0].get('physicalLocation', {})
-                file_uri = location.get('artifactLocation', {}).get('uri', 'unknown_file')
-                start_line = location.get('region', {}).get('startLine', 0)
-                full_file_path = os.path.join(full_project_source_path, file_uri)
-
-                code_snippet = ""
-                try:
-                    if os.path.exists(full_file_path):
-                        with open(full_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            lines = f.readlines()
-                            start_idx = max(0, start_line - 21)
-                            end_idx = min(len(lines), start_line + 20)
-                            code_snippet = "".join(lines[start_idx:end_idx])
-                except: pass
+    def _iter_analyses(self, project_name: str, sarif_path: str):
+        """
+        并发研判项目的 SARIF 告警，按完成顺序产出 (rule_id, file_uri, code_snippet, analysis_result)。
+        LLM 调用以网络等待为主，最多 FINDING_ANALYSIS_CONCURRENCY 条告警同时研判；
+        告警按需从 SARIF 流中拉取，额度用尽后不再提交新告警，调用方退出迭代时取消尚未开始的任务。
+        """
+        project_relative_path = project_name
+        full_project_source_path = os.path.join(PROJECTS_ROOT, project_relative_path)
+        # 同一源文件往往对应多条告警，按文件缓存其行列表（LRU，最多 SNIPPET_FILE_CACHE_SIZE 个文件）
+        file_lines_cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        cache_lock = threading.Lock()
+
+        def analyze(file_uri: str, start_line: int):
+            # 代码片段在工作线程中读取，多个告警的源文件读取与 LLM 请求一起并发进行
+            code_snippet = self._read_code_snippet(file_lines_cache, cache_lock, os.path.join(full_project_source_path, file_uri), start_line)
+            return code_snippet, self.vulnerability_analyzer.analyze_vulnerability(
+                project_name, code_snippet, project_relative_path, file_uri, start_line
+            )
+
+        self.reporter.log_info(f"🔍 Streaming CodeQL issues for {project_name}")
+        targets = self._iter_audit_targets(sarif_path)
+        issue_count = 0
+        pending = {}
+        # 熔断器打开时已在途的研判会以 status=aborted 返回，等熔断恢复后重新研判一次
+        retry_targets = deque()
+        with ThreadPoolExecutor(max_workers=FINDING_ANALYSIS_CONCURRENCY) as executor:
+            try:
+                while True:
+                    while len(pending) < FINDING_ANALYSIS_CONCURRENCY:
+                        if retry_targets:
+                            target, retried = retry_targets.popleft(), True
+                        else:
+                            target = None if targets is None or self.call_budget.exhausted(project_name) else next(targets, None)
+                            if target is None:
+                                targets = None
+                                break
+                            retried = False
+                            issue_count += 1
+                        rule_id, file_uri, start_line = target
+
+                        APICaller.wait_for_circuit()
+                        self.reporter.log_info(f"🕵️ Analyzing: {rule_id} @ {file_uri}:{start_line}")
+                        pending[executor.submit(analyze, file_uri, start_line)] = (target, retried)
+
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        target, retried = pending.pop(future)
+                        rule_id, file_uri, _ = target
+                        try:
+                            code_snippet, analysis_result = future.result()
+                        except Exception as e:
+                            self.reporter.log_error(f"Analysis error: {e}")
+                            continue
+                        if analysis_result.get('status') == 'aborted' and not retried:
+                            self.reporter.log_warning(f"⏸️ Analysis of {rule_id} @ {file_uri} aborted ({analysis_result.get('reason')}), will retry once the API recovers.")
+                            retry_targets.append(target)
+                            continue
+                        yield rule_id, file_uri, code_snippet, analysis_result
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        self.reporter.log_info(f"🔍 Processed {issue_count} issues in {project_name}")
+
+    def _process_finding(self, project_name: str, current_time_str: str, poc_base_dir: str, poc_counter,
+                         rule_id: str, file_uri: str, code_snippet: str, analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        补全单条研判结果的元数据，并对可测试的高/中危结果生成 PoC、自愈修复并交给 AI Judge 判定。
+        由 _audit_project 的 PoC 验证线程池调用，多条告警的 go test 与 LLM 等待相互重叠。
+        :return: 补全后的 analysis_result。
+        """
+        full_project_source_path = os.path.join(PROJECTS_ROOT, project_name)
+        analysis_result['original_rule_id'] = rule_id
+        analysis_result['code_snippet'] = code_snippet
+        analysis_result['file_uri'] = file_uri
+
+        # === [Core Logic] Self-Healing & AI-Judged Verification ===
+        poc_code = analysis_result.get('poc_code', '')
+        is_testable = analysis_result.get('is_testable', False)
+        verdict = analysis_result.get('verdict', '').upper()
+        
+        analysis_result['has_poc'] = False
+        analysis_result['verify_status'] = 'SKIPPED'
+        analysis_result['verify_output'] = ''
+        analysis_result['ai_judge_reason'] = '' 
+        analysis_result['fix_attempts'] = 0
 
-                if PROJECT_API_CALL_COUNTS.get(project_name, 0) >= MAX_CALLS_PER_PROJECT: break 
-                if APICaller._circuit_breaker_tripped: break
+        if (verdict in ['HIGH', 'MEDIUM']) and is_testable and poc_code and len(poc_code) > 20:
+            try:
+                poc_filename = f"{project_name}_{current_time_str}_{next(poc_counter)}_test.go"
+                poc_save_path = os.path.join(poc_base_dir, poc_filename)
+                
+                target_source_dir = os.path.dirname(os.path.join(full_project_source_path, file_uri))
+                # PoC 直接写在被测源码目录中供 go test 使用，验证结束后再移入 poc_base_dir 归档，
+                # 每次修复只需重写这一个文件，不再额外复制
+                poc_test_path = os.path.join(target_source_dir, poc_filename)
 
                 try:
-                    self.reporter.log_info(f"🕵️ Analyzing: {rule_id} @ {file_uri}:{start_line}")
-                    analysis_result = self.vulnerability_analyzer.analyze_vulnerability(
-                        project_name, code_snippet, project_relative_path, file_uri, start_line
-                    )
-                    
-                    analysis_result['original_rule_id'] = rule_id
-                    analysis_result['code_snippet'] = code_snippet
-                    analysis_result['file_uri'] = file_uri
-
-                    # === [Core Logic] Self-Healing & AI-Judged Verification ===
-                    poc_code = analysis_result.get('poc_code', '')
-                    is_testable = analysis_result.get('is_testable', False)
-                    verdict = analysis_result.get('verdict', '').upper()
-                    
-                    analysis_result['has_poc'] = False
-                    analysis_result['verify_status'] = 'SKIPPED'
-                    analysis_result['verify_output'] = ''
-                    analysis_result['ai_judge_reason'] = '' 
-                    analysis_result['fix_attempts'] = 0
-
-                    if (verdict in ['HIGH', 'MEDIUM']) and is_testable and poc_code and len(poc_code) > 20:
-                        try:
-                            if not os.path.exists(poc_base_dir): os.makedirs(poc_base_dir)
+                    clean_code = strip_code_fences(poc_code)
+                    _write_text_file(poc_test_path, clean_code)
+                
+                    self.reporter.log_info(f"💣 Draft Generated: {poc_filename}")
+                
+                    current_attempt_code = clean_code
+                    # 直接 exec go，不经过 shell；超时时被终止的就是 go 进程本身，而不是外层的 sh。命令在各次尝试间不变
+                    verify_cmd = ["go", "test", "-v", poc_filename]
+                    # 已经出现过的 (代码, 报错特征)：AI 修复后代码未变或又回到之前的版本时，重试只会得到同样的结果
+                    seen_failures = set()
+                
+                    for attempt in range(POC_MAX_FIX_ATTEMPTS + 1):
+                        self.reporter.log_info(f"🔧 [Verify] Attempt {attempt+1}/{POC_MAX_FIX_ATTEMPTS + 1}...")
 
-                            random_suffix = random.randint(1000, 9999)
-                            poc_filename = f"{project_name}_{current_time_str}_{random_suffix}_test.go"
-                            poc_save_path = os.path.join(poc_base_dir, poc_filename)
-                            
-                            with open(poc_save_path, "w", encoding="utf-8") as f:
-                                clean_code = poc_code.replace("```go", "").replace("```", "").strip()
-                                f.write(clean_code)
-                            
-                            self.reporter.log_info(f"💣 Draft Generated: {poc_filename}")
-                            
-                            target_source_dir = os.path.dirname(os.path.join(full_project_source_path, file_uri))
-                            
-                            MAX_FIX_ATTEMPTS = 8
-                            current_attempt_code = clean_code
-                            
-                            for attempt in range(MAX_FIX_ATTEMPTS + 1):
-                                self.reporter.log_info(f"🔧 [Verify] Attempt {attempt+1}/{MAX_FIX_ATTEMPTS + 1}...")
-
-                                copy_cmd = f"cp \"{poc_save_path}\" \"{target_source_dir}/\""
-                                os.system(copy_cmd)
-
-                                verify_cmd = f"cd \"{target_source_dir}\" && go test -v {poc_filename}"
-                                
-                                try:
-                                    process = subprocess.run(verify_cmd, shell=True, capture_output=True, text=True, timeout=15)
-                                    output = process.stdout + "\n" + process.stderr
-                                    
-                                    # 1. Quick check for obvious environmental errors (compile/missing package)
-                                    # We handle these with the "Self-Healing" loop before asking the AI Judge.
-                                    compile_errors = [
-                                        "build failed", "undefined:", "imported and not used",
-                                        "no required module", "cannot find package", "setup failed"
-                                    ]
-                                    is_compile_error = any(e in output for e in compile_errors)
-
-                                    if is_compile_error:
-                                        # === Compilation/Env Error: Auto-Fix ===
-                                        if attempt < MAX_FIX_ATTEMPTS:
-                                            self.reporter.log_warning(f"❌ Build/Env Failed. Asking AI to fix (Attempt {attempt+1})...")
-                                            fixed_code = self.vulnerability_analyzer.fix_poc_code(current_attempt_code, output)
-                                            current_attempt_code = fixed_code
-                                            with open(poc_save_path, "w", encoding="utf-8") as f:
-                                                f.write(fixed_code)
-                                            analysis_result['fix_attempts'] = attempt + 1
-                                            continue 
-                                        else:
-                                            analysis_result['verify_status'] = "COMPILATION_FAILED"
-                                            analysis_result['verify_output'] = output
-                                            analysis_result['fix_attempts'] = attempt
-                                    else:
-                                        # === Script ran! Send output to AI Judge for verdict ===
-                                        self.reporter.log_info(f"✅ Execution Finished! Asking AI Judge...")
-                                        
-                                        # Call AI Judge
-                                        judge_result = self._analyze_poc_output_with_ai(output)
-                                        
-                                        analysis_result['verify_status'] = judge_result.get("status", "UNKNOWN")
-                                        analysis_result['ai_judge_reason'] = judge_result.get("reason", "No reason provided")
-                                        analysis_result['verify_output'] = output
-                                        
-                                        self.reporter.log_info(f"⚖️ AI Verdict: {analysis_result['verify_status']} ({analysis_result['ai_judge_reason']})")
-                                        break 
-
-                                except subprocess.TimeoutExpired:
-                                    analysis_result['verify_status'] = "TIMEOUT"
-                                    analysis_result['verify_output'] = "Execution timed out."
+                        try:
+                            # 输出在读取时即截断为末尾部分，verify_output 及后续入库/报告都不再持有完整输出
+                            output = _run_capped(verify_cmd, target_source_dir, timeout=15)
+                        
+                            # 1. Quick check for obvious environmental errors (compile/missing package)
+                            # We handle these with the "Self-Healing" loop before asking the AI Judge.
+                            is_compile_error = COMPILE_ERROR_RE.search(output) is not None
+
+                            if is_compile_error:
+                                # === Compilation/Env Error: Auto-Fix ===
+                                failure_key = (current_attempt_code, _compile_error_signature(output))
+                                is_repeated_failure = failure_key in seen_failures
+                                seen_failures.add(failure_key)
+                                if is_repeated_failure:
+                                    self.reporter.log_warning(f"❌ Same build error for the same code again, giving up auto-fix.")
+                                if attempt < POC_MAX_FIX_ATTEMPTS and not is_repeated_failure:
+                                    self.reporter.log_warning(f"❌ Build/Env Failed. Asking AI to fix (Attempt {attempt+1})...")
+                                    fixed_code = self.vulnerability_analyzer.fix_poc_code(current_attempt_code, output)
+                                    current_attempt_code = fixed_code
+                                    _write_text_file(poc_test_path, fixed_code)
+                                    analysis_result['fix_attempts'] = attempt + 1
+                                    continue 
+                                else:
+                                    analysis_result['verify_status'] = "COMPILATION_FAILED"
+                                    analysis_result['verify_output'] = output
+                                    analysis_result['fix_attempts'] = attempt
                                     break
+                            else:
+                                # === Script ran! Send output to AI Judge for verdict ===
+                                self.reporter.log_info(f"✅ Execution Finished! Asking AI Judge...")
+                            
+                                # Call AI Judge
+                                judge_result = self._analyze_poc_output_with_ai(output)
                             
-                            analysis_result['has_poc'] = True
-                            analysis_result['poc_path'] = poc_save_path
+                                analysis_result['verify_status'] = judge_result.get("status", "UNKNOWN")
+                                analysis_result['ai_judge_reason'] = judge_result.get("reason", "No reason provided")
+                                analysis_result['verify_output'] = output
                             
-                            try:
-                                os.remove(os.path.join(target_source_dir, poc_filename))
-                            except: pass
+                                self.reporter.log_info(f"⚖️ AI Verdict: {analysis_result['verify_status']} ({analysis_result['ai_judge_reason']})")
+                                break 
+
+                        except subprocess.TimeoutExpired:
+                            analysis_result['verify_status'] = "TIMEOUT"
+                            analysis_result['verify_output'] = "Execution timed out."
+                            break
+                finally:
+                    # 验证中途出错（AI 修复、写文件、AI Judge 等抛出异常）时也要把 PoC 从被测项目中移走并归档，
+                    # 不在目标包里留下多余的 *_test.go
+                    if os.path.exists(poc_test_path):
+                        shutil.move(poc_test_path, poc_save_path)
+                        analysis_result['has_poc'] = True
+                        analysis_result['poc_path'] = poc_save_path
+
+            except Exception as e:
+                self.reporter.log_error(f"Failed to auto-verify PoC: {e}")
+        # 报告与入库都不使用 PoC 源码（已归档到 poc_path），不在项目结果列表中继续持有
+        analysis_result.pop('poc_code', None)
+        return analysis_result
+
+    def _audit_project(self, project_name: str, db_path: str, sarif_path: str):
+        """
+        AI 阶段：逐条研判 SARIF 结果、生成并验证 PoC、输出报告，最后清理数据库。
+        [修改] SARIF 结果边解析边研判，不再先把全部结果读入内存；LLM 研判由 _iter_analyses 并发进行，
+        PoC 验证由 _process_finding 在线程池中并发进行，入库在本线程按验证完成的顺序处理。
+        :return: 该项目的分析结果列表。
+        """
+        project_relative_path = project_name
+        current_time_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+        poc_base_dir = os.path.join(os.getcwd(), "poc_scripts", f"{project_name}_{current_time_str}")
+        # PoC 目录每个项目只创建一次，文件名用递增序号区分，不会像随机后缀那样冲突
+        os.makedirs(poc_base_dir, exist_ok=True)
+        poc_counter = itertools.count(1)
+
+        APICaller.wait_for_circuit()
+        # 重新扫描模式下项目从头审计，额度随之重置；续扫模式沿用中断前已消耗的额度
+        if self.rescan_mode:
+            self.call_budget.reset(project_name)
 
-                        except Exception as e:
-                            self.reporter.log_error(f"Failed to auto-verify PoC: {e}")
+        project_vulnerabilities = []
 
-                    project_vulnerabilities.append(analysis_result)
-                    self._save_to_sqlite(project_name, analysis_result)
-                    if analysis_result.get('status') == 'aborted': break 
+        # 各告警的 PoC 验证相互独立（文件名不同，go test 只编译指定的测试文件），
+        # 在线程池中并发进行，最多 POC_VERIFY_CONCURRENCY 个 go test 同时运行。
+        # 研判结果边产出边提交验证，已完成的验证随即入库；在途验证过多时暂停拉取新的研判结果
+        verify_pending = set()
+
+        def collect(done):
+            for future in done:
+                verify_pending.discard(future)
+                try:
+                    analysis_result = future.result()
                 except Exception as e:
                     self.reporter.log_error(f"Analysis error: {e}")
-
+                    continue
+                project_vulnerabilities.append(analysis_result)
+                self._save_to_sqlite(project_name, analysis_result)
+
+        with ThreadPoolExecutor(max_workers=POC_VERIFY_CONCURRENCY) as verify_pool:
+            for rule_id, file_uri, code_snippet, analysis_result in self._iter_analyses(project_name, sarif_path):
+                verify_pending.add(verify_pool.submit(self._process_finding, project_name, current_time_str, poc_base_dir, poc_counter,
+                                                      rule_id, file_uri, code_snippet, analysis_result))
+                block = len(verify_pending) >= 2 * POC_VERIFY_CONCURRENCY
+                done, _ = wait(verify_pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+                collect(done)
+            collect(as_completed(list(verify_pending)))
+
+        self._flush_vulns(project_name)
+        # 重试后仍因 API 故障中止的告警没有真正研判过：报告写入 partial 子目录、不记录为已扫描，续扫时整个项目重新审计
+        aborted_count = sum(1 for v in project_vulnerabilities if v.get('status') == 'aborted')
+        if aborted_count:
+            self.reporter.log_warning(f"⚠️ {aborted_count} findings of {project_name} were aborted by API failures; the project will be audited again on resume.")
+            self._save_project_report(project_name, project_vulnerabilities, partial=True)
+        else:
             self._save_project_report(project_name, project_vulnerabilities)
+            self._mark_project_scanned(project_name)
+        # 报告中引用了生成的 PoC 路径，因此只删除没有产生任何 PoC 的空目录
+        try:
+            os.rmdir(poc_base_dir)
+        except OSError:
+            pass
+        self.call_budget.flush()
+        self.context_resolver.clear_project_cache(project_relative_path)
+        if db_path:
             self.codeql_manager.cleanup_database(db_path)
-            if APICaller._circuit_breaker_tripped: break
-
-        self.reporter.log_info("MassAudit Pro: Process completed.")
+        return project_vulnerabilities
 
-if __name__ == "__main__":
+def _parse_args() -> argparse.Namespace:
+    """
+    解析命令行参数。未指定 --rescan/--resume 时回退到交互式选择，便于在 CI、cron 等无终端环境中运行。
+    """
+    parser = argparse.ArgumentParser(description="MassAudit Pro: CodeQL + LLM batch code audit.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--rescan', action='store_true', help="Re-scan all projects (bypassing the SARIF cache), writing new timestamped reports.")
+    mode.add_argument('--resume', action='store_true', help="Skip projects that already have a report.")
+    parser.add_argument('--projects-shard', type=int, default=0, help="Index of the project shard handled by this process (0-based).")
+    parser.add_argument('--num-shards', type=int, default=1, help="Total number of shards the project list is split into.")
+    args = parser.parse_args()
+    if args.num_shards < 1 or not 0 <= args.projects_shard < args.num_shards:
+        parser.error("--projects-shard must be in [0, --num-shards) and --num-shards must be >= 1")
+    return args
+
+def _interactive_prompt() -> bool:
+    """
+    交互式选择扫描模式。
+    :return: True 表示重新扫描，False 表示断点续传。
+    """
     print("\n" + "="*50)
     print("   🛡️  MassAudit Pro - Interactive Start")
     print("="*50)
@@ -424,7 +852,7 @@ if __name__ == "__main__":
     print(" [2] Resume [Recommended]")
     print("     - Skips already scanned projects.")
     print("="*50)
-    
+
     while True:
         choice = input("Enter choice (1 or 2): ").strip()
         if choice == '1':
@@ -437,7 +865,20 @@ if __name__ == "__main__":
             print("❌ Invalid input. Enter 1 or 2.")
 
     print(f"\n✅ Mode: {'Rescan' if is_rescan else 'Resume'}\n")
-    
+    return is_rescan
+
+if __name__ == "__main__":
+    setup_logging()
+    get_settings().apply_proxy_env()
+    if not API_KEY:
+        logging.warning("DEEPSEEK_API_KEY is not set. Configure it in the environment or in .env.")
+
+    args = _parse_args()
+    if args.rescan or args.resume:
+        is_rescan = args.rescan
+    else:
+        is_rescan = _interactive_prompt()
+
     # Start System
-    audit_system = AuditSystem(rescan_mode=is_rescan)
+    audit_system = AuditSystem(rescan_mode=is_rescan, shard_index=args.projects_shard, num_shards=args.num_shards)
     audit_system.run_audit()
\ No newline at end of file